@@ -0,0 +1,100 @@
+# pylint: disable=logging-fstring-interpolation,f-string-without-interpolation,consider-using-f-string
+"""
+  Compares the memory held by materialized CAI search results against the
+  compact inventory representation, using synthetic resources.
+
+  Protobuf messages are allocated outside of the Python allocator, so each
+  representation is built in a fresh process and measured by its peak RSS.
+
+  Usage: python -m benchmarks.inventory_memory [--count N]
+"""
+import multiprocessing
+import resource
+import sys
+import click
+from google.cloud import asset_v1
+from modules import inventory
+
+FIELDS = ("name", "asset_type", "parent", "parent_asset_type", "state",
+          "folders")
+
+
+def _search_results(count):
+  """
+    Yields synthetic search results spread over a few hundred folders.
+  """
+  for i in range(count):
+    folder = f"folders/{1000 + i % 300}"
+    yield asset_v1.ResourceSearchResult(
+        name=f"//orgpolicy.googleapis.com/{folder}/policies/constraint{i}",
+        asset_type="orgpolicy.googleapis.com/Policy",
+        parent_full_resource_name=
+        f"//cloudresourcemanager.googleapis.com/{folder}",
+        parent_asset_type="cloudresourcemanager.googleapis.com/Folder",
+        state="ACTIVE",
+        folders=[folder, "folders/999"],
+        organization="organizations/123456789",
+        display_name=f"constraint{i}",
+    )
+
+
+def _peak_rss():
+  """
+    Returns the peak resident set size of the current process, in bytes.
+  """
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _measure(representation, count, queue):
+  """
+    Builds one representation and reports the peak RSS growth it caused.
+  """
+  # Warm up imports and the message class before taking the baseline.
+  list(_search_results(10))
+  inventory.from_search_results(_search_results(10), FIELDS)
+  baseline = _peak_rss()
+
+  if representation == "proto-plus":
+    result = list(_search_results(count))
+  else:
+    result = inventory.from_search_results(_search_results(count), FIELDS)
+
+  queue.put((len(result), _peak_rss() - baseline))
+
+
+def _run(representation, count):
+  """
+    Measures a representation in a fresh process.
+  """
+  context = multiprocessing.get_context("spawn")
+  queue = context.Queue()
+  process = context.Process(target=_measure,
+                            args=(representation, count, queue))
+  process.start()
+  _, used = queue.get()
+  process.join()
+  return used
+
+
+@click.command()
+@click.option("--count", type=int, default=100000, show_default=True,
+              help="Number of synthetic resources.")
+def main(count):
+  """
+    Prints the memory used by both representations.
+  """
+  protos = _run("proto-plus", count)
+  compact = _run("inventory", count)
+
+  print(f"resources:           {count}")
+  print(f"proto-plus messages: {protos / 2**20:8.1f} MiB "
+        f"({protos / count:6.0f} B/resource)")
+  print(f"compact inventory:   {compact / 2**20:8.1f} MiB "
+        f"({compact / count:6.0f} B/resource)")
+  print(f"ratio:               {protos / max(compact, 1):8.1f}x")
+
+
+if __name__ == "__main__":
+  # pylint: disable=no-value-for-parameter
+  main()
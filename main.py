@@ -2,9 +2,10 @@
   Deletes resources from a Google Cloud organization.
 """
 import logging
+import sys
 import click
 from google.cloud import asset
-from modules import firewall_policies, log_sinks, org_policies, secure_tags, custom_roles, projects, folders, utils
+from modules import firewall_policies, log_sinks, org_policies, secure_tags, custom_roles, projects, folders, utils, verify, profiling, work_queue, sharding, estimate, exclusions
 
 # Set up logging configuration
 logger = logging.getLogger("default")
@@ -17,6 +18,9 @@ logging.root.setLevel(logging.INFO)
 @click.argument("organization_id", type=str, required=True)
 @click.option("--dry-run", is_flag=True,
               help="Perform a dry-run without actual deletions.")
+@click.option("--estimate-report",
+              help="With --dry-run, path of a JSON file to write the estimated "
+              "API calls and wall time to.")
 @click.option(
     "--exclude-customroles", help=
     "Custom roles to exclude, in 'organizations/{id}/roles/{customrole_name}' format, comma separated."
@@ -31,8 +35,12 @@ logging.root.setLevel(logging.INFO)
 )
 @click.option(
     "--exclude-projects", help=
-    "Log sinks to exclude in '{organizations,folders}/{id}/sinks/{sink_name}' format, comma separated."
+    "Projects to exclude, by project ID, comma separated."
 )
+@click.option(
+    "--exclusions-file", type=click.Path(exists=True, dir_okay=False),
+    help="File of exclusion rules, one '<kind> <pattern>' per line, matched "
+    "by exact name, prefix, glob or label.")
 @click.option("--only-customroles", is_flag=True,
               help="Only delete custom roles.")
 @click.option("--only-folders", is_flag=True, help="Only delete folders.")
@@ -44,20 +52,55 @@ logging.root.setLevel(logging.INFO)
 @click.option("--only-projects", is_flag=True, help="Only delete projects.")
 @click.option("--only-securetags", is_flag=True,
               help="Only delete secure tag keys and values")
-def main(organization_id, dry_run, exclude_customroles, exclude_log_sinks,
-         exclude_projects, only_customroles, only_orgpolicies, only_projects,
-         only_fwpolicies, only_logsinks, only_securetags, only_folders,
-         exclude_folders):
+@click.option("--workers", type=click.IntRange(min=1), default=1,
+              show_default=True,
+              help="Delete resources concurrently on a shared priority queue "
+              "with this many workers.")
+@click.option("--cai-shards", type=click.IntRange(min=1), default=1,
+              show_default=True,
+              help="Split organization-wide Cloud Asset Inventory searches "
+              "into folder subtrees searched with this many workers.")
+@click.option("--cai-shard-state", default=".org-cleaner-shards.json",
+              show_default=True,
+              help="File remembering shard sizes across runs, used to "
+              "balance shards.")
+@click.option("--cai-shard-check", is_flag=True,
+              help="Also run every sharded search unsharded and report "
+              "resources the shards missed.")
+@click.option("--verify", "run_verify", is_flag=True,
+              help="Re-scan the organization after deletion and report residue.")
+@click.option("--verify-only", is_flag=True,
+              help="Only verify, without deleting anything.")
+@click.option("--verify-workers", type=click.IntRange(min=1), default=16,
+              show_default=True,
+              help="Number of concurrent existence checks during verification.")
+@click.option("--verify-report",
+              help="Path of a JSON file to write the residue report to.")
+@click.option("--profile", is_flag=True,
+              help="Trace stages and API calls to a Chrome trace-event file.")
+@click.option("--profile-output", default="org-cleaner-trace.json",
+              show_default=True, help="Path of the trace-event JSON file.")
+@click.option("--profile-cprofile", is_flag=True,
+              help="With --profile, also write a cProfile dump per stage.")
+def main(organization_id, dry_run, estimate_report, exclude_customroles,
+         exclude_log_sinks, exclude_projects, exclusions_file, only_customroles,
+         only_orgpolicies, only_projects, only_fwpolicies, only_logsinks,
+         only_securetags, only_folders, exclude_folders, workers, cai_shards,
+         cai_shard_state, cai_shard_check, run_verify, verify_only,
+         verify_workers, verify_report, profile, profile_output,
+         profile_cprofile):
   """
     Deletes resources from a Google Cloud organization.
 
     Args:
         organization_id (str): The ID of the organization.
         dry_run (bool): If True, only simulate the deletions without actually performing them.
+        estimate_report (str): Path of a JSON file to write the dry-run estimate to.
         exclude_customroles (str): Comma-separated list of custom role names to exclude from deletion.
         exclude_folders (str): Comma-separated list of folder IDs to exclude from deletion.
         exclude_log_sinks (str): Comma-separated list of log sink names to exclude from deletion.
         exclude_projects (str): Comma-separated list of project IDs to exclude from deletion.
+        exclusions_file (str): Path of a file of exclusion rules.
         only_customroles (bool): If True, only delete custom roles.
         only_folders (bool): If True, only delete folders.
         only_orgpolicies (bool): If True, only delete organization policies.
@@ -65,45 +108,147 @@ def main(organization_id, dry_run, exclude_customroles, exclude_log_sinks,
         only_fwpolicies (bool): If True, only delete firewall policies.
         only_logsinks (bool): If True, only delete log sinks.
         only_securetags (bool): If True, only delete secure tag keys and values.
+        workers (int): Number of concurrent deletion workers. With 1, stages run sequentially.
+        cai_shards (int): Number of concurrent CAI search shards. With 1, searches are not sharded.
+        cai_shard_state (str): Path of the file remembering shard sizes across runs.
+        cai_shard_check (bool): If True, compare every sharded search with an unsharded one.
+        run_verify (bool): If True, verify the organization is clean after deletion.
+        verify_only (bool): If True, only verify without deleting anything.
+        verify_workers (int): Number of concurrent existence checks during verification.
+        verify_report (str): Path of a JSON file to write the residue report to.
+        profile (bool): If True, trace stages and API calls.
+        profile_output (str): Path of the trace-event JSON file.
+        profile_cprofile (bool): If True, also write a cProfile dump per stage.
     """
+  if run_verify and dry_run:
+    raise click.UsageError(
+        "--verify checks the result of a real run and cannot be combined "
+        "with --dry-run, use --verify-only instead.")
+
   logger.info("Starting")
 
+  if profile:
+    profiling.enable(profile_output, cprofile=profile_cprofile)
+
+  try:
+    excluded = exclusions.from_options(exclusions_file,
+                                       customroles=exclude_customroles,
+                                       folders=exclude_folders,
+                                       logsinks=exclude_log_sinks,
+                                       projects=exclude_projects)
+  except ValueError as e:
+    raise click.UsageError(str(e)) from e
+
+  estimator = estimate.start() if dry_run and not verify_only else None
+
   delete_all = not any([
       only_customroles, only_orgpolicies, only_logsinks, only_fwpolicies,
       only_securetags, only_projects, only_folders
   ])
 
+  stages = [
+      stage for stage, selected in [
+          ("customroles", only_customroles),
+          ("orgpolicies", only_orgpolicies),
+          ("fwpolicies", only_fwpolicies),
+          ("logsinks", only_logsinks),
+          ("securetags", only_securetags),
+          ("projects", only_projects),
+          ("folders", only_folders),
+      ] if selected or delete_all
+  ]
+
+  cai_client = asset.AssetServiceClient()
+  if cai_shards > 1:
+    cai_client = sharding.ShardedAssetServiceClient(cai_client,
+                                                    organization_id, cai_shards,
+                                                    cai_shard_state,
+                                                    check=cai_shard_check)
+
+  if verify_only:
+    _verify(cai_client, organization_id, stages, excluded, verify_workers,
+            verify_report)
+    return
+
   folder_list = []
   requires_folder_list = any([only_folders, only_projects, only_fwpolicies
                              ]) or delete_all
-  exclude_folders = exclude_folders if exclude_folders is not None else []
   if requires_folder_list:
-    folder_list = utils.list_all_folders(organization_id, exclude_folders)
-
-  cai_client = asset.AssetServiceClient()
-
-  if delete_all or only_customroles:
-    custom_roles.delete(organization_id, exclude_customroles, dry_run)
+    folder_list = utils.list_all_folders(organization_id, excluded["folder"])
+
+  if workers > 1:
+    tasks = []
+    if "customroles" in stages:
+      tasks += custom_roles.plan(organization_id, excluded["customrole"],
+                                  dry_run)
+    if "orgpolicies" in stages:
+      tasks += org_policies.plan(cai_client, organization_id, dry_run)
+    if "fwpolicies" in stages:
+      tasks += firewall_policies.plan(cai_client, organization_id, dry_run)
+    if "logsinks" in stages:
+      tasks += log_sinks.plan(cai_client, organization_id,
+                              excluded["logsink"], dry_run)
+    if "securetags" in stages:
+      tasks += secure_tags.plan(cai_client, organization_id, dry_run)
+    if "projects" in stages:
+      tasks += projects.plan(cai_client, organization_id, folder_list,
+                             excluded["project"], dry_run)
+    if "folders" in stages:
+      tasks += folders.plan(folder_list, dry_run)
+    work_queue.run(tasks, workers)
+  else:
+    _run_stages(cai_client, organization_id, folder_list, stages, excluded,
+                dry_run)
+
+  if estimator is not None:
+    estimator.report(workers, report_file=estimate_report)
+
+  if run_verify:
+    _verify(cai_client, organization_id, stages, excluded, verify_workers,
+            verify_report)
+
+
+def _run_stages(cai_client, organization_id, folder_list, stages, excluded,
+                dry_run):
+  """
+    Runs the selected stages one after the other, in a fixed order.
+  """
+  if "customroles" in stages:
+    custom_roles.delete(organization_id, excluded["customrole"], dry_run)
 
-  if delete_all or only_orgpolicies:
+  if "orgpolicies" in stages:
     org_policies.delete(cai_client, organization_id, dry_run)
 
-  if delete_all or only_fwpolicies:
+  if "fwpolicies" in stages:
     firewall_policies.delete(cai_client, organization_id, dry_run)
 
-  if delete_all or only_logsinks:
-    log_sinks.delete(cai_client, organization_id, exclude_log_sinks, dry_run)
+  if "logsinks" in stages:
+    log_sinks.delete(cai_client, organization_id, excluded["logsink"],
+                     dry_run)
 
-  if delete_all or only_securetags:
+  if "securetags" in stages:
     secure_tags.delete(cai_client, organization_id, dry_run)
 
-  if delete_all or only_projects:
-    projects.delete(folder_list, exclude_projects, dry_run)
+  if "projects" in stages:
+    projects.delete(cai_client, organization_id, folder_list,
+                    excluded["project"], dry_run)
 
-  if delete_all or only_folders:
+  if "folders" in stages:
     folders.delete(folder_list, dry_run)
 
 
+def _verify(cai_client, organization_id, stages, excluded, verify_workers,
+            verify_report):
+  """
+    Runs the verification stage, exiting with a non-zero status on residue.
+  """
+  residue = verify.verify(cai_client, organization_id, stages, excluded,
+                          max_workers=verify_workers,
+                          report_file=verify_report)
+  if residue:
+    sys.exit(1)
+
+
 if __name__ == "__main__":
   # pylint: disable=no-value-for-parameter
   main()
@@ -3,10 +3,11 @@
   Deletes custom IAM roles at the organization level.
 """
 
+import functools
 import logging
 from google.cloud.iam_admin_v1 import IAMClient, ListRolesRequest, RoleView, DeleteRoleRequest, Role
-from google.cloud.iam_admin_v1.services.iam.pagers import ListRolesPager
 from google.api_core.exceptions import FailedPrecondition, NotFound
+from modules import estimate, inventory, work_queue
 
 logger = logging.getLogger("default")
 
@@ -17,43 +18,58 @@ def delete(organization_id, exclude_custom_roles, dry_run):
 
     Parameters:
       organization_id (str): The ID of the organization.
-      exclude_custom_roles (str): Comma-separated list of custom role names to exclude from deletion.
+      exclude_custom_roles (exclusions.ExclusionSet): Custom roles to exclude from deletion.
       dry_run (bool, optional): If True, only simulate the deletions without actually performing them. Default is False.
     """
   logger.info("Starting processing custom roles")
 
+  for task in plan(organization_id, exclude_custom_roles, dry_run):
+    task.run()
+
+  logger.info("Done processing custom roles")
+
+
+def plan(organization_id, exclude_custom_roles, dry_run):
+  """
+    List the deletion tasks for custom roles at the organization level.
+
+    Parameters:
+      organization_id (str): The ID of the organization.
+      exclude_custom_roles (exclusions.ExclusionSet): Custom roles to exclude from deletion.
+      dry_run (bool, optional): If True, tasks only simulate the deletions. Default is False.
+
+    Returns:
+      list: A list of work_queue.DeletionTask objects.
+    """
   custom_role_list = _list_custom_roles(organization_id)
 
   logger.info(f"Retrieved {len(custom_role_list)} custom role(s)")
 
-  exclude_custom_roles_list = exclude_custom_roles.split(
-      ",") if exclude_custom_roles else []
-
+  tasks = []
   for role in custom_role_list:
     role_id = role.name.split('/')[-1]
 
-    if role.name in exclude_custom_roles_list:
+    if exclude_custom_roles.matches(role.name):
       logger.info(f"Excluding custom role '{role.name}'")
       continue
 
-    log_message = "%sDeleting custom role %s ." % ("(Simulated) " if dry_run
-                                                   else "", role.name)
-    logger.info(log_message)
-
-    if not dry_run:
-      _delete_custom_role(organization_id, role_id)
+    tasks.append(
+        work_queue.DeletionTask(
+            role.name, "customrole",
+            functools.partial(_delete_custom_role, organization_id, role_id,
+                              dry_run)))
 
-  logger.info("Done processing custom roles")
+  return tasks
 
 
-def _list_custom_roles(organization_id: str) -> ListRolesPager:
+def _list_custom_roles(organization_id: str) -> inventory.Inventory:
   """
     Lists custom IAM roles in a GCP organization.
 
     Args:
         organization_id: GCP organization ID
 
-    Returns: A pager for traversing through the roles
+    Returns: An inventory.Inventory of role names
   """
   client = IAMClient()
   parent = f"organizations/{organization_id}"
@@ -62,23 +78,33 @@ def _list_custom_roles(organization_id: str) -> ListRolesPager:
       show_deleted=False,
       view=RoleView.BASIC,
   )
-  roles = client.list_roles(request)
-  custom_roles = [role for role in roles]
+  custom_roles = inventory.Inventory()
+  for role in client.list_roles(request):
+    custom_roles.append(name=role.name)
   return custom_roles
 
 
-def _delete_custom_role(organization_id: str, role_id: str) -> Role:
+def _delete_custom_role(organization_id: str, role_id: str,
+                        dry_run: bool = False) -> Role:
   """
     Deletes a custom IAM role in a GCP organization.
 
     Args:
         organization_id: GCP organization ID
         role_id: ID of the GCP custom IAM role
+        dry_run: If True, only simulate the deletion without actually performing it.
 
     Returns: The deleted google.cloud.iam_admin_v1.Role object
   """
-  client = IAMClient()
   name = f"organizations/{organization_id}/roles/{role_id}"
+  log_message = "%sDeleting custom role %s ." % ("(Simulated) " if dry_run
+                                                 else "", name)
+  logger.info(log_message)
+  estimate.record("IAMClient.delete_role")
+  if dry_run:
+    return None
+
+  client = IAMClient()
   request = DeleteRoleRequest(name=name)
   try:
     role = client.delete_role(request)
@@ -0,0 +1,297 @@
+# pylint: disable=logging-fstring-interpolation,f-string-without-interpolation,consider-using-f-string
+"""
+  Predicts the API calls and wall time of a real run from a dry run.
+"""
+import contextlib
+import json
+import logging
+import threading
+from collections import Counter, defaultdict
+from modules import profiling, verify, work_queue
+
+logger = logging.getLogger("default")
+
+# Latency of a deletion relative to a read on the same API. Firewall policy
+# associations wait for their long-running operation to complete.
+WRITE_LATENCY_FACTORS = {
+    "ProjectsClient.delete_project": 3.0,
+    "FirewallPoliciesClient.remove_association": 10.0,
+}
+DEFAULT_WRITE_LATENCY_FACTOR = 1.5
+
+# Used when no read on any API could be timed, in seconds
+DEFAULT_LATENCY = 0.2
+
+# Number of reads timed per API before latencies are considered known
+SAMPLE_SIZE = 3
+
+# API client whose reads are used to time the deletions of each task kind,
+# with the CAI asset type used to sample them.
+KIND_CLIENTS = {
+    "customrole": ("IAMClient", verify.CUSTOM_ROLE),
+    "orgpolicy": ("OrgPolicyClient", verify.ORG_POLICY),
+    "logsink": ("_SinksAPI", verify.LOG_SINK),
+    "fwpolicy": ("FirewallPoliciesClient", verify.FIREWALL_POLICY),
+    "fwassociation": ("FirewallPoliciesClient", None),
+    "tagvalue": ("TagValuesClient", verify.TAG_VALUE),
+    "tagkey": ("TagKeysClient", verify.TAG_KEY),
+    "project": ("ProjectsClient", verify.PROJECT),
+    "folder": ("FoldersClient", verify.FOLDER),
+}
+
+# Calls whose latency is measured under a different name
+LATENCY_SOURCES = {
+    "liens": "HttpRequest",
+}
+
+_estimator = None
+_local = threading.local()
+
+
+class Estimator:
+  """
+    Collects the reads issued and the deletions simulated during a dry run.
+
+    Attributes:
+        reads (Counter): Number of reads per API method.
+        writes (Counter): Number of deletions per API method.
+  """
+
+  def __init__(self):
+    self.reads = Counter()
+    self.writes = Counter()
+    self.tasks = {}
+    self._task_reads = defaultdict(float)
+    self._task_writes = defaultdict(Counter)
+    self._task_read_calls = defaultdict(Counter)
+    self._latencies = defaultdict(list)
+    self._discovery_spans = []
+    self._lock = threading.Lock()
+
+  def on_span(self, name, cat, start, end):
+    """
+      Records a read RPC issued by the dry run. Reads issued while probing
+      only contribute to latencies.
+    """
+    if cat != "rpc":
+      return
+    duration = end - start
+    task = work_queue.current_task()
+    with self._lock:
+      self._latencies[name.split(".")[0]].append(duration)
+      if getattr(_local, "probing", False):
+        return
+      self.reads[name.replace(" (next page)", "")] += 1
+      if task is None:
+        self._discovery_spans.append((start, end))
+      else:
+        self.tasks[task.key] = task
+        self._task_reads[task.key] += duration
+
+  def record(self, name, count):
+    """
+      Records deletions the current task issues, or would issue.
+    """
+    task = work_queue.current_task()
+    with self._lock:
+      self.writes[name] += count
+      if task is not None:
+        self.tasks[task.key] = task
+        self._task_writes[task.key][name] += count
+
+  def record_read(self, name, count):
+    """
+      Records reads the current task would issue in a real run, which the dry
+      run did not issue itself.
+    """
+    task = work_queue.current_task()
+    with self._lock:
+      self.reads[name] += count
+      if task is not None:
+        self.tasks[task.key] = task
+        self._task_read_calls[task.key][name] += count
+
+  def latency(self, name):
+    """
+      Returns the mean measured read latency of the API serving a call.
+    """
+    client = name.split(".")[0]
+    samples = self._latencies.get(LATENCY_SOURCES.get(client, client))
+    if samples:
+      return sum(samples) / len(samples)
+    everything = [s for samples in self._latencies.values() for s in samples]
+    if everything:
+      return sum(everything) / len(everything)
+    return DEFAULT_LATENCY
+
+  def sample(self):
+    """
+      Times a few reads on APIs the dry run did not read from, by fetching
+      resources which are about to be deleted.
+    """
+    by_kind = defaultdict(list)
+    for task in self.tasks.values():
+      by_kind[task.kind].append(task)
+
+    samples = []
+    for kind, tasks in by_kind.items():
+      client, asset_type = KIND_CLIENTS.get(kind, (None, None))
+      if asset_type is None:
+        continue
+      for task in tasks[:max(0, SAMPLE_SIZE - len(self._latencies[client]))]:
+        samples.append((asset_type, task))
+    if not samples:
+      return
+
+    checkers = verify.existence_checkers(
+        [asset_type for asset_type, _ in samples])
+    for asset_type, task in samples:
+      name = task.key
+      if asset_type == verify.FIREWALL_POLICY:
+        name = name.split("/")[-1]
+      with probe():
+        verify.check(checkers, asset_type, name)
+
+  def discovery(self):
+    """
+      Returns the wall time spent on reads outside of deletion tasks, in
+      seconds. Reads issued concurrently, e.g. by CAI shards, are counted once.
+    """
+    elapsed = 0.0
+    current_start = current_end = None
+    for start, end in sorted(self._discovery_spans):
+      if current_end is None or start > current_end:
+        if current_end is not None:
+          elapsed += current_end - current_start
+        current_start, current_end = start, end
+      else:
+        current_end = max(current_end, end)
+    if current_end is not None:
+      elapsed += current_end - current_start
+    return elapsed
+
+  def durations(self):
+    """
+      Predicts how long each task takes in a real run, in seconds.
+    """
+    durations = {}
+    for key in self.tasks:
+      duration = self._task_reads[key]
+      for name, count in self._task_read_calls[key].items():
+        duration += count * self.latency(name)
+      for name, count in self._task_writes[key].items():
+        duration += count * self.latency(name) * WRITE_LATENCY_FACTORS.get(
+            name, DEFAULT_WRITE_LATENCY_FACTOR)
+      durations[key] = duration
+    return durations
+
+  def report(self, workers, report_file=None):
+    """
+      Logs the predicted API calls and wall time of a real run.
+
+      Parameters:
+          workers (int): Number of concurrent deletion workers of the real run.
+          report_file (str, optional): Path of a JSON file to write the estimate to.
+
+      Returns:
+          dict: The estimate.
+    """
+    self.sample()
+
+    tasks = list(self.tasks.values())
+    durations = self.durations()
+    deletion = work_queue.simulate(tasks, workers, durations)
+    sequential = sum(durations.values())
+    discovery = self.discovery()
+
+    estimate = {
+        "reads": dict(self.reads),
+        "writes": dict(self.writes),
+        "total_rpcs": sum(self.reads.values()) + sum(self.writes.values()),
+        "tasks": len(tasks),
+        "workers": workers,
+        "discovery_seconds": round(discovery, 1),
+        "deletion_seconds": round(deletion, 1),
+        "sequential_deletion_seconds": round(sequential, 1),
+        "latencies_ms": {
+            name: round(1000 * sum(samples) / len(samples), 1)
+            for name, samples in self._latencies.items()
+        },
+    }
+
+    logger.info("Estimated API calls for a real run:")
+    for kind, counter in (("read", self.reads), ("delete", self.writes)):
+      for name, count in sorted(counter.items()):
+        logger.info(f"  {kind:6} {name}: {count}")
+    logger.info(f"Estimated total: {estimate['total_rpcs']} API call(s) "
+                f"for {len(tasks)} deletion task(s)")
+    logger.info(f"Estimated wall time: {discovery:.1f}s discovery + "
+                f"{deletion:.1f}s deletion with {workers} worker(s) "
+                f"({sequential:.1f}s with 1 worker)")
+
+    if report_file:
+      with open(report_file, "w", encoding="utf-8") as f:
+        json.dump(estimate, f, indent=2)
+      logger.info(f"Estimate written to {report_file}")
+
+    return estimate
+
+
+def start():
+  """
+    Starts collecting calls for an estimate.
+
+    Returns:
+        Estimator: The active estimator.
+  """
+  global _estimator  # pylint: disable=global-statement
+  _estimator = Estimator()
+  profiling.add_listener(_estimator.on_span)
+  return _estimator
+
+
+def active():
+  """
+    Tells whether an estimate is being collected.
+  """
+  return _estimator is not None
+
+
+def record(name, count=1):
+  """
+    Records deletion calls a real run issues. Does nothing unless an estimate
+    is being collected.
+
+    Parameters:
+        name (str): The API call, as '{Client}.{method}'.
+        count (int): Number of calls.
+  """
+  if _estimator is not None and count:
+    _estimator.record(name, count)
+
+
+def record_read(name, count=1):
+  """
+    Records read calls a real run issues but the dry run does not. Does
+    nothing unless an estimate is being collected.
+
+    Parameters:
+        name (str): The API call, as '{Client}.{method}'.
+        count (int): Number of calls.
+  """
+  if _estimator is not None and count:
+    _estimator.record_read(name, count)
+
+
+@contextlib.contextmanager
+def probe():
+  """
+    Marks reads which only the dry run issues, so they are timed but not
+    counted.
+  """
+  previous = getattr(_local, "probing", False)
+  _local.probing = True
+  try:
+    yield
+  finally:
+    _local.probing = previous
@@ -0,0 +1,214 @@
+# pylint: disable=logging-fstring-interpolation,f-string-without-interpolation,consider-using-f-string
+"""
+  Compiles resource exclusions into fast matchers.
+
+  Exclusions are read from the command line options and, optionally, from a
+  file with one '<kind> <pattern>' rule per line, separated by spaces or
+  tabs, where kind is one of KINDS. Patterns are interpreted as:
+
+    labels.<key>=<value>   a label selector (projects only)
+    labels.<key>           a label key selector, any value (projects only)
+    <prefix>/              every resource whose name starts with the prefix
+    a glob (*, ? or [])    every resource whose name matches the glob
+    anything else          the exact resource name (or ID for projects)
+
+  Blank lines and lines starting with '#' are ignored.
+"""
+import fnmatch
+import logging
+import re
+
+logger = logging.getLogger("default")
+
+KINDS = ("customrole", "folder", "logsink", "project")
+
+# Kinds of resource whose label selectors can be applied
+LABELLED_KINDS = ("project",)
+
+_TERMINAL = ""
+
+
+class ExclusionSet:
+  """
+    The exclusions of a single kind of resource.
+
+    Exact names are matched with a hash set, prefixes with a trie over
+    '/'-separated segments, and all globs with one compiled regular
+    expression, so matching does not depend on the number of rules.
+
+    Attributes:
+        labels (list): Label selectors as (key, value) tuples, value None
+                       matching any value.
+  """
+
+  def __init__(self, allow_labels=False):
+    """
+      Parameters:
+          allow_labels (bool, optional): If True, accept label selectors.
+    """
+    self.labels = []
+    self._allow_labels = allow_labels
+    self._exact = set()
+    self._trie = {}
+    self._globs = []
+    self._glob_re = None
+
+  def add(self, pattern):
+    """
+      Adds a rule, see the module documentation for the pattern syntax.
+
+      Raises:
+          ValueError: If the rule is a label selector and label selectors are
+                      not accepted, or is invalid.
+    """
+    pattern = pattern.strip()
+    if not pattern:
+      return
+    if pattern.startswith("labels."):
+      if not self._allow_labels:
+        raise ValueError(f"Label selector '{pattern}' is only supported for "
+                         f"{', '.join(LABELLED_KINDS)} rules")
+      key, _, value = pattern[len("labels."):].partition("=")
+      if not key:
+        raise ValueError(f"Invalid label selector '{pattern}'")
+      self.labels.append((key, value or None))
+    elif pattern.endswith("/"):
+      node = self._trie
+      for segment in pattern.strip("/").split("/"):
+        node = node.setdefault(segment, {})
+      node[_TERMINAL] = {}
+    elif any(c in pattern for c in "*?["):
+      self._globs.append(pattern)
+      self._glob_re = None
+    else:
+      self._exact.add(pattern)
+
+  def matches(self, name, labels=None):
+    """
+      Tells whether a resource is excluded.
+
+      Parameters:
+          name (str): The resource name, or project ID for projects.
+          labels (dict, optional): The resource labels, if any.
+
+      Returns:
+          bool: True if any rule matches.
+    """
+    if name in self._exact:
+      return True
+
+    if self._trie:
+      node = self._trie
+      for segment in name.split("/"):
+        node = node.get(segment)
+        if node is None:
+          break
+        if _TERMINAL in node:
+          return True
+
+    if self._globs:
+      if self._glob_re is None:
+        self._glob_re = re.compile("|".join(
+            f"(?:{fnmatch.translate(glob)})" for glob in self._globs))
+      if self._glob_re.match(name):
+        return True
+
+    if labels and self.labels:
+      for key, value in self.labels:
+        if key in labels and (value is None or labels[key] == value):
+          return True
+
+    return False
+
+  def label_query(self):
+    """
+      Builds a Cloud Asset Inventory query fragment excluding the label
+      selectors, so excluded resources are filtered out server-side. Values
+      are matched exactly, as in matches().
+
+      Returns:
+          str: The query fragment, empty if there are no label selectors.
+    """
+    return " AND ".join(
+        f"NOT labels.{key}={value}" if value is not None else
+        f"NOT labels.{key}:*" for key, value in self.labels)
+
+  def __bool__(self):
+    return bool(self._exact or self._trie or self._globs or self.labels)
+
+
+class Exclusions:
+  """
+    The exclusions of every kind of resource, indexed by kind.
+  """
+
+  def __init__(self):
+    self._sets = {
+        kind: ExclusionSet(allow_labels=kind in LABELLED_KINDS)
+        for kind in KINDS
+    }
+
+  def __getitem__(self, kind):
+    return self._sets[kind]
+
+  def add(self, kind, pattern):
+    """
+      Adds a rule for a kind of resource.
+    """
+    if kind not in self._sets:
+      raise ValueError(
+          f"Unknown exclusion kind '{kind}', expected one of {', '.join(KINDS)}"
+      )
+    self._sets[kind].add(pattern)
+
+  def add_list(self, kind, patterns):
+    """
+      Adds comma-separated rules for a kind of resource.
+    """
+    for pattern in (patterns or "").split(","):
+      self.add(kind, pattern)
+
+  def load(self, path):
+    """
+      Adds the rules of an exclusions file.
+    """
+    count = 0
+    with open(path, encoding="utf-8") as f:
+      for lineno, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+          continue
+        kind, *pattern = line.split(None, 1)
+        try:
+          if not pattern:
+            raise ValueError(f"Missing pattern for '{kind}'")
+          self.add(kind, pattern[0])
+        except ValueError as e:
+          raise ValueError(f"{path}:{lineno}: {e}") from e
+        count += 1
+    logger.info(f"Loaded {count} exclusion(s) from {path}")
+
+
+def from_options(exclusions_file=None, customroles=None, folders=None,
+                 logsinks=None, projects=None):
+  """
+    Builds the exclusions from the command line options.
+
+    Parameters:
+        exclusions_file (str, optional): Path of an exclusions file.
+        customroles (str, optional): Comma-separated custom role names.
+        folders (str, optional): Comma-separated folder names.
+        logsinks (str, optional): Comma-separated log sink names.
+        projects (str, optional): Comma-separated project IDs.
+
+    Returns:
+        Exclusions: The compiled exclusions.
+  """
+  exclusions = Exclusions()
+  exclusions.add_list("customrole", customroles)
+  exclusions.add_list("folder", folders)
+  exclusions.add_list("logsink", logsinks)
+  exclusions.add_list("project", projects)
+  if exclusions_file:
+    exclusions.load(exclusions_file)
+  return exclusions
@@ -2,8 +2,10 @@
 """
   Deletes firewall policies for an organization.
 """
+import functools
 import logging
 from google.cloud import compute_v1
+from modules import estimate, profiling, work_queue
 
 logger = logging.getLogger("default")
 
@@ -19,31 +21,58 @@ def delete(cai_client, organization_id, dry_run):
     """
   logger.info("Starting processing firewall policies")
 
+  tasks = plan(cai_client, organization_id, dry_run)
+  for task in tasks:
+    task.run()
+
+  if not dry_run:
+    logger.info(
+        f"{sum(1 for t in tasks if t.kind == 'fwpolicy')} policy/ies deleted.")
+
+  logger.info("Done processing firewall policies")
+
+
+def plan(cai_client, organization_id, dry_run):
+  """
+    List the deletion tasks for firewall policies and their associations.
+    Association tasks precede the task of the policy they belong to and the
+    task of the folder they are attached to.
+
+    Parameters:
+        cai_client (google.cloud.asset_v1.AssetServiceClient): The Cloud Asset Inventory client.
+        organization_id (str): The ID of the organization.
+        dry_run (bool, optional): If True, tasks only simulate the deletions. Default is False.
+
+    Returns:
+        list: A list of work_queue.DeletionTask objects.
+    """
   fw_policy_list = _list_fw_policies(cai_client, organization_id)
 
   fw_policy_client = compute_v1.FirewallPoliciesClient()
 
   logger.info(f"Retrieved {len(fw_policy_list)} policy/ies")
 
+  tasks = []
   for policy in fw_policy_list:
     policy_id = policy['name'].replace(
         "//compute.googleapis.com/locations/global/firewallPolicies/", "")
+    policy_key = f"firewallPolicies/{policy_id}"
 
-    for association in policy.get('associations', []):
-      _delete_policy_association(fw_policy_client, policy_id, association,
-                                 dry_run=dry_run)
-    log_message = "%sDeleting firewall policy key %s." % (
-        "(Simulated) " if dry_run else "", policy_id)
-    logger.info(log_message)
+    for association, target in policy.get('associations', []):
+      tasks.append(
+          work_queue.DeletionTask(
+              f"{policy_key}/associations/{association}", "fwassociation",
+              functools.partial(_delete_policy_association, fw_policy_client,
+                                policy_id, association, dry_run=dry_run),
+              parent=[policy_key, target]))
 
-    if not dry_run:
-      fw_policy_client.delete(request=compute_v1.DeleteFirewallPolicyRequest(
-          firewall_policy=policy_id,))
+    tasks.append(
+        work_queue.DeletionTask(
+            policy_key, "fwpolicy",
+            functools.partial(_delete_policy, fw_policy_client, policy_id,
+                              dry_run), parent=policy.get('parent')))
 
-  if not dry_run:
-    logger.info(f"{len(fw_policy_list)} policy/ies deleted.")
-
-  logger.info("Done processing firewall policies")
+  return tasks
 
 
 def _list_fw_policies(cai_client, organization_id):
@@ -56,7 +85,8 @@ def _list_fw_policies(cai_client, organization_id):
 
     Returns:
         list: A list of dictionaries containing firewall policy information.
-              Each dictionary has the following keys: 'name' and 'associations'.
+              Each dictionary has the following keys: 'name', 'parent' and 'associations',
+              a list of (association name, attachment target) tuples.
     """
   ret = []
 
@@ -64,10 +94,9 @@ def _list_fw_policies(cai_client, organization_id):
       request={
           "scope": f"organizations/{organization_id}",
           "asset_types": ["compute.googleapis.com/FirewallPolicy"],
-          "read_mask": "name,versionedResources",
+          "read_mask": "name,parentFullResourceName,versionedResources",
           "page_size": 500
       })
-  list(results_iterator)
 
   for resource in results_iterator:
     associations = resource.versioned_resources[0].resource.get(
@@ -75,12 +104,37 @@ def _list_fw_policies(cai_client, organization_id):
 
     ret.append({
         "name": resource.name,
-        "associations": [association['name'] for association in associations]
+        "parent": resource.parent_full_resource_name.replace(
+            "//cloudresourcemanager.googleapis.com/", ""),
+        "associations": [
+            (association['name'], "/".join(
+                association.get('attachmentTarget', '').split("/")[-2:]))
+            for association in associations
+        ]
     })
 
   return ret
 
 
+def _delete_policy(fw_policy_client, policy_id, dry_run):
+  """
+    Delete a firewall policy.
+
+    Parameters:
+        fw_policy_client (google.cloud.compute_v1.FirewallPoliciesClient): The Firewall Policies client.
+        policy_id (str): The ID of the firewall policy.
+        dry_run (bool, optional): If True, only simulate the deletion without actually performing it. Default is False.
+    """
+  log_message = "%sDeleting firewall policy key %s." % (
+      "(Simulated) " if dry_run else "", policy_id)
+  logger.info(log_message)
+
+  estimate.record("FirewallPoliciesClient.delete")
+  if not dry_run:
+    fw_policy_client.delete(request=compute_v1.DeleteFirewallPolicyRequest(
+        firewall_policy=policy_id,))
+
+
 def _delete_policy_association(fw_policy_client, policy_id, association,
                                dry_run):
   """
@@ -98,6 +152,9 @@ def _delete_policy_association(fw_policy_client, policy_id, association,
 
   request = compute_v1.RemoveAssociationFirewallPolicyRequest(
       firewall_policy=policy_id, name=association)
+  estimate.record("FirewallPoliciesClient.remove_association")
   if not dry_run:
-    fw_policy_client.remove_association(
-        request=request).result()  # Wait for the operation to complete.
+    operation = fw_policy_client.remove_association(request=request)
+    with profiling.span("firewall_policies.remove_association.result",
+                        "lro", policy=policy_id, association=association):
+      operation.result()  # Wait for the operation to complete.
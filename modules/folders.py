@@ -2,9 +2,10 @@
 """
   Deletes all folders under an organization.
 """
+import functools
 import logging
-from collections import deque
 from google.cloud import resourcemanager_v3
+from modules import estimate, work_queue
 
 logger = logging.getLogger("default")
 
@@ -20,25 +21,61 @@ def delete(folder_list, dry_run):
     """
   logger.info("Starting processing folders")
 
+  for task in plan(folder_list, dry_run):
+    task.run()
+
+  logger.info("Done processing folders")
+
+
+def plan(folder_list, dry_run):
+  """
+    List the deletion tasks for folders, child folders first. Each folder task
+    is parented to its parent folder.
+
+    Parameters:
+        folders_list (list): List of folder objects, as returned by utils.list_all_folders.
+        dry_run (bool, optional): If True, tasks only simulate the deletions. Default is False.
+
+    Returns:
+        list: A list of work_queue.DeletionTask objects.
+    """
   logger.info(f"Retrieved {len(folder_list)} folder(s)")
 
   client = resourcemanager_v3.FoldersClient()
 
+  tasks = []
   # Delete folders in reverse order to handle child folders first
   for folder in reversed(folder_list):
     if folder.name.split('/')[0] == "organizations":
       continue
 
-    folder_id = folder.name.split('/')[1]
+    tasks.append(
+        work_queue.DeletionTask(
+            folder.name, "folder",
+            functools.partial(_delete_folder, client, folder.name, dry_run),
+            parent=folder.parent))
 
-    log_message = "%sDeleting folder %s." % ("(Simulated) " if dry_run else "",
-                                             folder_id)
-    logger.info(log_message)
+  return tasks
 
-    if not dry_run:
-      try:
-        client.delete_folder(name=folder.name)
-      except Exception as e:
-        logger.error(f"Failed to delete folder {folder_id}: {e}")
 
-  logger.info("Done processing folders")
+def _delete_folder(client, folder_name, dry_run):
+  """
+    Delete a folder.
+
+    Parameters:
+        client (google.cloud.resourcemanager_v3.FoldersClient): The Resource Manager Folders client.
+        folder_name (str): The name of the folder, in 'folders/{folder_id}' format.
+        dry_run (bool, optional): If True, only simulate the deletion without actually performing it. Default is False.
+    """
+  folder_id = folder_name.split('/')[1]
+
+  log_message = "%sDeleting folder %s." % ("(Simulated) " if dry_run else "",
+                                           folder_id)
+  logger.info(log_message)
+
+  estimate.record("FoldersClient.delete_folder")
+  if not dry_run:
+    try:
+      client.delete_folder(name=folder_name)
+    except Exception as e:
+      logger.error(f"Failed to delete folder {folder_id}: {e}")
@@ -0,0 +1,170 @@
+# pylint: disable=logging-fstring-interpolation,f-string-without-interpolation,consider-using-f-string
+"""
+  Compact, array-backed storage for the resources discovered in an organization.
+
+  API responses are converted on the fly, keeping only the fields needed to
+  delete the resources. Fields which are unique per resource, see
+  UNIQUE_FIELDS, are kept as plain strings; every other field is stored as an
+  integer id into a shared, interned name table, since parents, asset types
+  and ancestries repeat across resources.
+"""
+import threading
+from array import array
+
+FIELDS = ("name", "asset_type", "parent", "parent_asset_type", "state",
+          "folders", "project_id", "labels")
+
+# Fields which are unique per resource, so interning them would only grow the
+# shared name table
+UNIQUE_FIELDS = ("name", "project_id")
+
+
+class NameTable:
+  """
+    Interns hashable values (strings or tuples of strings) into integer ids.
+    Id 0 always stands for None.
+  """
+
+  def __init__(self):
+    self._values = [None]
+    self._ids = {None: 0}
+    self._lock = threading.Lock()
+
+  def intern(self, value):
+    """
+      Returns the id of a value, adding it to the table if needed.
+    """
+    value_id = self._ids.get(value)
+    if value_id is not None:
+      return value_id
+    with self._lock:
+      value_id = self._ids.get(value)
+      if value_id is None:
+        value_id = len(self._values)
+        self._values.append(value)
+        self._ids[value] = value_id
+      return value_id
+
+  def __getitem__(self, value_id):
+    return self._values[value_id]
+
+  def __len__(self):
+    return len(self._values)
+
+
+# Shared by every inventory, so asset types, parents and ancestries which
+# repeat across resources are only stored once.
+NAMES = NameTable()
+
+
+class Record:
+  """
+    A lightweight view of a single resource. Fields which were not stored in
+    the inventory are None.
+  """
+  __slots__ = FIELDS
+
+  def __init__(self, **values):
+    for field in FIELDS:
+      setattr(self, field, values.get(field))
+
+  def __repr__(self):
+    return f"Record({self.name})"
+
+
+class Inventory:
+  """
+    An append-only, array-backed list of resources.
+
+    Attributes:
+        fields (tuple): Names of the stored fields, a subset of FIELDS.
+  """
+
+  def __init__(self, fields=("name",)):
+    unknown = set(fields) - set(FIELDS)
+    if unknown:
+      raise ValueError(f"Unknown inventory field(s): {', '.join(unknown)}")
+    if "name" not in fields:
+      raise ValueError("Inventory fields must include 'name'")
+    self.fields = tuple(fields)
+    self._strings = {
+        field: [] for field in self.fields if field in UNIQUE_FIELDS
+    }
+    self._columns = {
+        field: array("L")
+        for field in self.fields
+        if field not in UNIQUE_FIELDS
+    }
+
+  def append(self, **values):
+    """
+      Adds a resource, given as keyword arguments named after the fields.
+    """
+    for field, column in self._strings.items():
+      column.append(values.get(field))
+    for field, column in self._columns.items():
+      column.append(NAMES.intern(values.get(field)))
+
+  def __len__(self):
+    return len(self._strings["name"])
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [self[i] for i in range(*index.indices(len(self)))]
+    values = {field: column[index] for field, column in self._strings.items()}
+    for field, column in self._columns.items():
+      values[field] = NAMES[column[index]]
+    return Record(**values)
+
+  def __iter__(self):
+    for index in range(len(self)):
+      yield self[index]
+
+  def __reversed__(self):
+    for index in reversed(range(len(self))):
+      yield self[index]
+
+
+def from_search_results(results, fields=("name",), predicate=None):
+  """
+    Converts Cloud Asset Inventory search results into an inventory, one
+    result at a time, so pages can be released as soon as they are consumed.
+
+    Args:
+        results: An iterable of google.cloud.asset_v1.ResourceSearchResult.
+        fields: Names of the fields to keep, a subset of FIELDS.
+        predicate: Optional function selecting which results to keep.
+
+    Returns: An Inventory of the selected resources.
+  """
+  inventory = Inventory(fields)
+  for resource in results:
+    if predicate is not None and not predicate(resource):
+      continue
+    inventory.append(**search_result_values(resource, inventory.fields))
+  return inventory
+
+
+def search_result_values(resource, fields):
+  """
+    Extracts the given fields from a CAI search result.
+
+    Args:
+        resource: A google.cloud.asset_v1.ResourceSearchResult.
+        fields: Names of the fields to extract, a subset of FIELDS.
+
+    Returns: A dictionary of field values, suitable for Inventory.append.
+  """
+  values = {}
+  for field in fields:
+    if field == "parent":
+      values[field] = resource.parent_full_resource_name or None
+    elif field == "folders":
+      values[field] = tuple(resource.folders)
+    elif field == "project_id":
+      values[field] = resource.additional_attributes.get("projectId")
+    elif field == "labels":
+      values[field] = tuple(sorted(resource.labels.items()))
+    else:
+      values[field] = getattr(resource, field) or None
+  return values
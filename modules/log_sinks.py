@@ -2,8 +2,10 @@
 """
   Deletes all log sinks created at folder and organization level
 """
+import functools
 import logging
 from google.cloud import logging_v2
+from modules import estimate, inventory, work_queue
 
 logger = logging.getLogger("default")
 
@@ -15,15 +17,33 @@ def delete(cai_client, organization_id, exclude_log_sinks, dry_run):
     Parameters:
         cai_client (google.cloud.asset_v1.AssetServiceClient): The Cloud Asset Inventory client.
         organization_id (str): The ID of the organization.
-        exclude_log_sinks (str): Comma-separated list of log sink names to exclude from deletion.
+        exclude_log_sinks (exclusions.ExclusionSet): Log sinks to exclude from deletion.
         dry_run (bool, optional): If True, only simulate the deletions without actually performing them. Default is False.
     """
 
   logger.info("Starting processing log sinks")
 
-  exclude_log_sinks = exclude_log_sinks.split(",") if exclude_log_sinks else []
+  for task in plan(cai_client, organization_id, exclude_log_sinks, dry_run):
+    task.run()
+
+  logger.info(f"Done processing log sinks")
+
+
+def plan(cai_client, organization_id, exclude_log_sinks, dry_run):
+  """
+    List the deletion tasks for log sinks created at folder and organization level
+
+    Parameters:
+        cai_client (google.cloud.asset_v1.AssetServiceClient): The Cloud Asset Inventory client.
+        organization_id (str): The ID of the organization.
+        exclude_log_sinks (exclusions.ExclusionSet): Log sinks to exclude from deletion.
+        dry_run (bool, optional): If True, tasks only simulate the deletions. Default is False.
+
+    Returns:
+        list: A list of work_queue.DeletionTask objects.
+    """
   log_sinks_list = [
-      x.replace("//logging.googleapis.com/", "")
+      x.name.replace("//logging.googleapis.com/", "")
       for x in _list_log_sinks(cai_client, organization_id)
   ]
 
@@ -31,17 +51,19 @@ def delete(cai_client, organization_id, exclude_log_sinks, dry_run):
 
   log_sinks_client = logging_v2.Client()
 
+  tasks = []
   for sink in log_sinks_list:
-    if not sink in exclude_log_sinks:
-      log_message = "%sDeleting sink %s." % ("(Simulated) " if dry_run else "",
-                                             sink)
-      logger.info(log_message)
-      if not dry_run:
-        log_sinks_client.sinks_api.sink_delete(sink)
+    if not exclude_log_sinks.matches(sink):
+      tasks.append(
+          work_queue.DeletionTask(
+              sink, "logsink",
+              functools.partial(_delete_log_sink, log_sinks_client, sink,
+                                dry_run),
+              parent="/".join(sink.split("/")[:2])))
     else:
       logger.info(f"Skipping sink '{sink}'")
 
-  logger.info(f"Done processing log sinks")
+  return tasks
 
 
 def _list_log_sinks(cai_client, organization_id):
@@ -54,24 +76,35 @@ def _list_log_sinks(cai_client, organization_id):
         organization_id (str): The ID of the organization.
 
     Returns:
-        list: A list of log sinks.
+        inventory.Inventory: The log sink names.
     """
-  ret = []
-
   results_iterator = cai_client.search_all_resources(
       request={
           "scope": f"organizations/{organization_id}",
           "asset_types": ["logging.googleapis.com/LogSink"],
           "page_size": 500,
       })
-  list(results_iterator)
+  return inventory.from_search_results(
+      results_iterator, predicate=lambda resource: resource.parent_asset_type in
+      [
+          "cloudresourcemanager.googleapis.com/Folder",
+          "cloudresourcemanager.googleapis.com/Organization"
+      ] and not (resource.name.endswith("_Default") or resource.name.endswith(
+          "_Required")))
 
-  for resource in results_iterator:
-    if resource.parent_asset_type in [
-        "cloudresourcemanager.googleapis.com/Folder",
-        "cloudresourcemanager.googleapis.com/Organization"
-    ] and not (resource.name.endswith("_Default") or
-               resource.name.endswith("_Required")):
-      ret.append(resource.name)
 
-  return ret
+def _delete_log_sink(log_sinks_client, sink, dry_run):
+  """
+    Delete a log sink.
+
+    Parameters:
+        log_sinks_client (google.cloud.logging_v2.Client): The Cloud Logging client.
+        sink (str): The name of the sink to delete.
+        dry_run (bool, optional): If True, only simulate the deletion without actually performing it. Default is False.
+    """
+  log_message = "%sDeleting sink %s." % ("(Simulated) " if dry_run else "",
+                                         sink)
+  logger.info(log_message)
+  estimate.record("_SinksAPI.sink_delete")
+  if not dry_run:
+    log_sinks_client.sinks_api.sink_delete(sink)
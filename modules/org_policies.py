@@ -2,8 +2,10 @@
 """
   Deletes all org policies at folder and organization level
 """
+import functools
 import logging
 from google.cloud import orgpolicy_v2
+from modules import estimate, inventory, work_queue
 
 logger = logging.getLogger("default")
 
@@ -20,25 +22,41 @@ def delete(cai_client, organization_id, dry_run):
 
   logger.info(f"Starting processing org policies")
 
+  for task in plan(cai_client, organization_id, dry_run):
+    task.run()
+
+  logger.info(f"Done processing org policies")
+
+
+def plan(cai_client, organization_id, dry_run):
+  """
+    List the deletion tasks for organization policies.
+
+    Parameters:
+        cai_client (google.cloud.asset_v1.AssetServiceClient): The Cloud Asset Inventory client.
+        organization_id (str): The ID of the organization.
+        dry_run (bool, optional): If True, tasks only simulate the deletions. Default is False.
+
+    Returns:
+        list: A list of work_queue.DeletionTask objects.
+    """
   org_policy_list = _list_org_policies(cai_client, organization_id)
 
   org_policy_client = orgpolicy_v2.OrgPolicyClient()
 
   logger.info(f"Retrieved {len(org_policy_list)} organization policies.")
 
+  tasks = []
   for policy in org_policy_list:
-    policy = policy.replace("//orgpolicy.googleapis.com/", "")
+    policy = policy.name.replace("//orgpolicy.googleapis.com/", "")
+    tasks.append(
+        work_queue.DeletionTask(
+            policy, "orgpolicy",
+            functools.partial(_delete_org_policy, org_policy_client, policy,
+                              dry_run),
+            parent="/".join(policy.split("/")[:2])))
 
-    log_message = "%sDeleting organization policy %s." % (
-        "(Simulated) " if dry_run else "", policy)
-    logger.info(log_message)
-
-    request = orgpolicy_v2.DeletePolicyRequest(name=policy,)
-
-    if not dry_run:
-      org_policy_client.delete_policy(request=request)
-
-  logger.info(f"Done processing org policies")
+  return tasks
 
 
 def _list_org_policies(cai_client, organization_id):
@@ -50,19 +68,32 @@ def _list_org_policies(cai_client, organization_id):
         organization_id (str): The ID of the organization.
 
     Returns:
-        list: A list of organization policy names.
+        inventory.Inventory: The organization policy names.
     """
-  ret = []
-
   results_iterator = cai_client.search_all_resources(
       request={
           "scope": f"organizations/{organization_id}",
           "asset_types": ["orgpolicy.googleapis.com/Policy"],
           "page_size": 500,
       })
-  list(results_iterator)
+  return inventory.from_search_results(results_iterator)
+
+
+def _delete_org_policy(org_policy_client, policy, dry_run):
+  """
+    Delete an organization policy.
+
+    Parameters:
+        org_policy_client (google.cloud.orgpolicy_v2.OrgPolicyClient): The Org Policy client.
+        policy (str): The name of the policy to delete.
+        dry_run (bool, optional): If True, only simulate the deletion without actually performing it. Default is False.
+    """
+  log_message = "%sDeleting organization policy %s." % (
+      "(Simulated) " if dry_run else "", policy)
+  logger.info(log_message)
 
-  for resource in results_iterator:
-    ret.append(resource.name)
+  request = orgpolicy_v2.DeletePolicyRequest(name=policy,)
 
-  return ret
+  estimate.record("OrgPolicyClient.delete_policy")
+  if not dry_run:
+    org_policy_client.delete_policy(request=request)
@@ -0,0 +1,333 @@
+# pylint: disable=logging-fstring-interpolation,f-string-without-interpolation,consider-using-f-string
+"""
+  Opt-in tracing of stages and outbound RPCs, written as Chrome trace events.
+
+  The resulting JSON file can be opened in chrome://tracing, Perfetto or
+  speedscope to inspect the critical path of a run.
+"""
+import atexit
+import cProfile
+import contextlib
+import functools
+import inspect
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+
+logger = logging.getLogger("default")
+
+# Module functions recorded as stages, profiled with cProfile if enabled.
+# Other functions are recorded as plain function spans.
+STAGE_FUNCTIONS = ("delete", "plan", "verify", "list_all_folders")
+
+# Functions called while recording spans, which are not traced themselves
+_UNTRACED = ("work_queue.current_task",)
+
+_tracer = None
+_listeners = []
+_instrumented = False
+
+
+class Tracer:
+  """
+    Collects complete ('X') trace events from any thread.
+  """
+
+  def __init__(self, cprofile_dir=None):
+    self.events = []
+    self.cprofile_dir = cprofile_dir
+    self._lock = threading.Lock()
+    self._local = threading.local()
+    self._origin = time.perf_counter()
+    self._thread_names = {}
+    self._task_profilers = []
+
+  def add(self, name, cat, start, end, args=None):
+    """
+      Records a span measured with time.perf_counter().
+    """
+    thread = threading.current_thread()
+    event = {
+        "name": name,
+        "cat": cat,
+        "ph": "X",
+        "ts": (start - self._origin) * 1e6,
+        "dur": (end - start) * 1e6,
+        "pid": os.getpid(),
+        "tid": thread.ident,
+    }
+    if args:
+      event["args"] = {k: str(v) for k, v in args.items()}
+    with self._lock:
+      self.events.append(event)
+      self._thread_names[thread.ident] = thread.name
+
+  def write(self, path):
+    """
+      Writes the collected events to a Chrome trace-event JSON file.
+    """
+    with self._lock:
+      metadata = [{
+          "name": "thread_name",
+          "ph": "M",
+          "pid": os.getpid(),
+          "tid": tid,
+          "args": {
+              "name": name
+          }
+      } for tid, name in self._thread_names.items()]
+      events = metadata + list(self.events)
+    with open(path, "w", encoding="utf-8") as f:
+      json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    logger.info(f"Trace with {len(events)} event(s) written to {path}")
+    self._write_task_profiles()
+
+  def task_profiler(self, kind):
+    """
+      Returns the cProfile profiler of a task kind for the current thread.
+    """
+    profilers = getattr(self._local, "task_profilers", None)
+    if profilers is None:
+      profilers = self._local.task_profilers = {}
+    if kind not in profilers:
+      profilers[kind] = cProfile.Profile()
+      with self._lock:
+        self._task_profilers.append((kind, profilers[kind]))
+    return profilers[kind]
+
+  def _write_task_profiles(self):
+    """
+      Merges the task profiles of every thread into one cProfile dump per
+      task kind.
+    """
+    by_kind = {}
+    with self._lock:
+      for kind, profiler in self._task_profilers:
+        if kind in by_kind:
+          by_kind[kind].add(profiler)
+        else:
+          by_kind[kind] = pstats.Stats(profiler)
+    for kind, stats in by_kind.items():
+      path = os.path.join(self.cprofile_dir, f"tasks-{kind}.prof")
+      stats.dump_stats(path)
+      logger.info(f"Profile of {kind} tasks written to {path}")
+
+
+def enable(output, cprofile=False):
+  """
+    Enables tracing for the rest of the process and writes the trace on exit.
+
+    Parameters:
+        output (str): Path of the trace-event JSON file.
+        cprofile (bool): If True, also write a cProfile dump per stage next to the trace.
+  """
+  global _tracer  # pylint: disable=global-statement
+  cprofile_dir = None
+  if cprofile:
+    cprofile_dir = os.path.dirname(os.path.abspath(output))
+  _tracer = Tracer(cprofile_dir=cprofile_dir)
+  instrument()
+
+  atexit.register(_tracer.write, output)
+  logger.info(f"Profiling enabled, trace will be written to {output}")
+
+
+def instrument():
+  """
+    Wraps the stage modules and API clients so their calls produce spans.
+    Safe to call more than once.
+  """
+  global _instrumented  # pylint: disable=global-statement
+  if _instrumented:
+    return
+  _instrumented = True
+  _instrument_modules()
+  _instrument_tasks()
+  _instrument_clients()
+
+
+def add_listener(listener):
+  """
+    Calls a function for every span recorded from now on, instrumenting the
+    stage modules and API clients if needed.
+
+    Parameters:
+        listener (callable): Called with the span name, category, start and end
+                             times from time.perf_counter().
+  """
+  instrument()
+  _listeners.append(listener)
+
+
+@contextlib.contextmanager
+def span(name, cat="function", **args):
+  """
+    Traces the enclosed block. Does nothing unless profiling is enabled.
+
+    Parameters:
+        name (str): Name of the span.
+        cat (str): Category of the span, e.g. 'stage' or 'rpc'.
+        args: Extra attributes attached to the span.
+  """
+  if _tracer is None and not _listeners:
+    yield
+    return
+  start = time.perf_counter()
+  try:
+    yield
+  finally:
+    end = time.perf_counter()
+    if _tracer is not None:
+      _tracer.add(name, cat, start, end, args)
+    for listener in _listeners:
+      listener(name, cat, start, end)
+
+
+def _traced(func, name, cat, profile=False):
+  """
+    Wraps a function so each call is recorded as a span.
+
+    Parameters:
+        func (callable): The function to wrap.
+        name (str): Name of the span.
+        cat (str): Category of the span.
+        profile (bool): If True, run the outermost call per thread under cProfile.
+  """
+  if getattr(func, "__traced__", False):
+    return func
+
+  @functools.wraps(func)
+  def wrapper(*args, **kwargs):
+    profiler = None
+    if profile and _tracer is not None and _tracer.cprofile_dir and not getattr(
+        _tracer._local, "profiling", False):  # pylint: disable=protected-access
+      _tracer._local.profiling = True  # pylint: disable=protected-access
+      profiler = cProfile.Profile()
+      profiler.enable()
+    try:
+      with span(name, cat):
+        result = func(*args, **kwargs)
+    finally:
+      if profiler is not None:
+        profiler.disable()
+        _tracer._local.profiling = False  # pylint: disable=protected-access
+        profiler.dump_stats(
+            os.path.join(_tracer.cprofile_dir,
+                         f"{name.replace('.', '-')}.{time.time_ns()}.prof"))
+    if cat == "rpc":
+      _trace_next_pages(result, name)
+    return result
+
+  wrapper.__traced__ = True
+  return wrapper
+
+
+def _trace_next_pages(result, name):
+  """
+    Traces the page fetches a GAPIC pager issues while it is iterated.
+  """
+  method = getattr(result, "_method", None)
+  if method is not None and callable(method):
+    # pylint: disable=protected-access
+    result._method = _traced(method, f"{name} (next page)", "rpc")
+
+
+def _instrument_modules():
+  """
+    Wraps every function defined in the stage modules. Functions listed in
+    STAGE_FUNCTIONS are recorded as stages, others as functions.
+  """
+  # pylint: disable=import-outside-toplevel
+  from modules import (custom_roles, firewall_policies, folders, log_sinks,
+                       org_policies, projects, secure_tags, sharding, utils,
+                       verify, work_queue)
+
+  for module in [
+      custom_roles, firewall_policies, folders, log_sinks, org_policies,
+      projects, secure_tags, sharding, utils, verify, work_queue
+  ]:
+    short_name = module.__name__.split(".")[-1]
+    for name, func in inspect.getmembers(module, inspect.isfunction):
+      if (func.__module__ != module.__name__ or
+          f"{short_name}.{name}" in _UNTRACED):
+        continue
+      is_stage = name in STAGE_FUNCTIONS
+      setattr(
+          module, name,
+          _traced(func, f"{short_name}.{name}", "stage" if is_stage else
+                  "function", profile=is_stage))
+
+
+def _instrument_tasks():
+  """
+    Profiles deletion tasks per kind in the worker thread running them, since
+    cProfile only sees the thread it is enabled in. Tasks run from a stage
+    already profiled in the same thread, i.e. sequentially, are left to it.
+  """
+  # pylint: disable=import-outside-toplevel,protected-access
+  from modules import work_queue
+
+  run = work_queue.DeletionTask.run
+  if getattr(run, "__traced__", False):
+    return
+
+  @functools.wraps(run)
+  def wrapper(task):
+    if (_tracer is None or not _tracer.cprofile_dir or
+        getattr(_tracer._local, "profiling", False)):
+      return run(task)
+    profiler = _tracer.task_profiler(task.kind)
+    try:
+      profiler.enable()
+    except ValueError:
+      # Python 3.12+ allows a single active profiler per process
+      return run(task)
+    _tracer._local.profiling = True
+    try:
+      return run(task)
+    finally:
+      profiler.disable()
+      _tracer._local.profiling = False
+
+  wrapper.__traced__ = True
+  work_queue.DeletionTask.run = wrapper
+
+
+def _instrument_clients():
+  """
+    Wraps the constructor and every public method of the API clients used by
+    the stage modules, so each outbound RPC is recorded as a span.
+  """
+  # pylint: disable=import-outside-toplevel
+  from google.cloud import (asset_v1, compute_v1, orgpolicy_v2,
+                            resourcemanager_v3)
+  from google.cloud.iam_admin_v1 import IAMClient
+  from google.cloud.logging_v2 import _gapic, _http
+  from googleapiclient import http
+
+  for cls in [
+      asset_v1.AssetServiceClient,
+      compute_v1.FirewallPoliciesClient,
+      orgpolicy_v2.OrgPolicyClient,
+      resourcemanager_v3.FoldersClient,
+      resourcemanager_v3.ProjectsClient,
+      resourcemanager_v3.TagBindingsClient,
+      resourcemanager_v3.TagKeysClient,
+      resourcemanager_v3.TagValuesClient,
+      IAMClient,
+      _gapic._SinksAPI,  # pylint: disable=protected-access
+      _http._SinksAPI,  # pylint: disable=protected-access
+  ]:
+    cls.__init__ = _traced(cls.__init__, f"{cls.__name__}()", "client")
+    for name in dir(cls):
+      if name.startswith("_"):
+        continue
+      if inspect.isfunction(inspect.getattr_static(cls, name)):
+        setattr(cls, name,
+                _traced(getattr(cls, name), f"{cls.__name__}.{name}", "rpc"))
+
+  http.HttpRequest.execute = _traced(http.HttpRequest.execute,
+                                     "HttpRequest.execute", "rpc")
@@ -2,76 +2,176 @@
 """
   Deletes all projects which exist within an organization.
 """
+import functools
 import logging
+import threading
 from google.cloud import resourcemanager_v3
 from google.cloud.resourcemanager_v3 import SearchProjectsRequest
-from google.cloud.resourcemanager_v3.services.projects.pagers import ListProjectsPager
 
 from googleapiclient.discovery import build
+from modules import estimate, inventory, work_queue
 
 logger = logging.getLogger("default")
 
+_local = threading.local()
 
-def delete(folders_list, exclude_projects, dry_run):
+
+def delete(cai_client, organization_id, folders_list, exclude_projects,
+           dry_run):
   """
   Delete projects within the specified organization, including any existing liens.
 
   Parameters:
+      cai_client (google.cloud.asset_v1.AssetServiceClient): The Cloud Asset Inventory client.
       organization_id (str): The ID of the organization.
       folders_list (list): List of folder objects to process for project deletion.
-      exclude_projects(str): Comma-separated list of project IDs to exclude from deletion.
+      exclude_projects (exclusions.ExclusionSet): Projects to exclude from deletion, by project ID or label.
       dry_run (bool, optional): If True, only simulate the deletions without actually performing them. Default is False.
   """
   logger.info("Starting processing projects")
 
-  exclude_projects_list = exclude_projects.split(
-      ",") if exclude_projects else []
+  for task in plan(cai_client, organization_id, folders_list, exclude_projects,
+                   dry_run):
+    task.run()
+
+  logger.info("Done processing projects")
+
+
+def plan(cai_client, organization_id, folders_list, exclude_projects, dry_run):
+  """
+  List the deletion tasks for projects within the specified folders.
+
+  Projects are listed per folder with SearchProjects. When label selectors are
+  excluded, a single Cloud Asset Inventory search filtering them out is used
+  instead, since SearchProjects queries cannot negate labels.
+
+  Parameters:
+      cai_client (google.cloud.asset_v1.AssetServiceClient): The Cloud Asset Inventory client.
+      organization_id (str): The ID of the organization.
+      folders_list (list): List of folder objects to process for project deletion.
+      exclude_projects (exclusions.ExclusionSet): Projects to exclude from deletion, by project ID or label.
+      dry_run (bool, optional): If True, tasks only simulate the deletions. Default is False.
+
+  Returns:
+      list: A list of work_queue.DeletionTask objects, keyed by project number
+            as in 'projects/{project_number}' and parented to their folder.
+  """
   project_client = resourcemanager_v3.ProjectsClient()
 
+  projects_by_parent = None
+  if exclude_projects.labels:
+    projects_by_parent = _search_projects(cai_client, organization_id,
+                                          exclude_projects.label_query())
+
+  tasks = []
   for folder in reversed(folders_list):
-    project_list = _list_projects(folder.name)
+    if projects_by_parent is None:
+      project_list = _list_projects(folder.name)
+    else:
+      project_list = projects_by_parent.get(folder.name, [])
     logger.info(
-        f"Retrieved {len(list(project_list))} project(s) under folder {folder.name}"
+        f"Retrieved {len(project_list)} project(s) under folder {folder.name}"
     )
 
     for project in project_list:
       project_id = project.project_id
 
-      if project_id not in exclude_projects_list:
-        log_message = "%sDeleting project %s." % ("(Simulated) " if dry_run else
-                                                  "", project_id)
-        logger.info(log_message)
+      if exclude_projects.matches(project_id):
+        logger.info(f"Excluding project '{project_id}'")
+        continue
 
-        if not dry_run:
-          _delete_project(project_client, project_id)
+      # Keyed by number, as CAI names the resources within the project
+      tasks.append(
+          work_queue.DeletionTask(
+              project.name, "project",
+              functools.partial(_delete_project, project_client, project_id,
+                                dry_run), parent=folder.name))
 
-  logger.info("Done processing projects")
+  return tasks
 
 
-def _list_projects(folder_name: str) -> ListProjectsPager:
+def _list_projects(folder_name: str) -> inventory.Inventory:
   """
   Lists projects within the specified folder.
 
   Args:
       folder_name: GCP folder name in the format 'folders/{folder_id}'
 
-  Returns: A pager for traversing through the projects
+  Returns: An inventory.Inventory of project names and IDs
   """
   client = resourcemanager_v3.ProjectsClient()
   request = SearchProjectsRequest(
       query=f"parent.id:{folder_name.split('/')[-1]} state:ACTIVE",)
-  projects = client.search_projects(request=request)
+  projects = inventory.Inventory(fields=("name", "project_id"))
+  for project in client.search_projects(request=request):
+    projects.append(name=project.name, project_id=project.project_id)
+  return projects
+
+
+def _search_projects(cai_client, organization_id: str, query: str) -> dict:
+  """
+  Lists the active projects of an organization matching a CAI query.
+
+  Args:
+      cai_client: The Cloud Asset Inventory client.
+      organization_id: GCP organization ID
+      query: CAI query fragment, e.g. excluding labels
+
+  Returns: A dictionary mapping each parent, in the format 'folders/{folder_id}'
+           or 'organizations/{organization_id}', to an inventory.Inventory of
+           project names and IDs
+  """
+  results_iterator = cai_client.search_all_resources(
+      request={
+          "scope": f"organizations/{organization_id}",
+          "asset_types": ["cloudresourcemanager.googleapis.com/Project"],
+          "query": f"state:ACTIVE AND {query}" if query else "state:ACTIVE",
+          "read_mask": "name,parentFullResourceName,additionalAttributes",
+          "page_size": 500
+      })
+
+  projects = {}
+  for resource in results_iterator:
+    parent = resource.parent_full_resource_name.replace(
+        "//cloudresourcemanager.googleapis.com/", "")
+    if parent not in projects:
+      projects[parent] = inventory.Inventory(fields=("name", "project_id"))
+    projects[parent].append(
+        name=resource.name.replace("//cloudresourcemanager.googleapis.com/",
+                                   ""),
+        project_id=resource.additional_attributes.get("projectId"))
   return projects
 
 
-def _delete_project(project_client, project_id):
+def _delete_project(project_client, project_id, dry_run=False):
   """
   Deletes a project, handling any existing liens.
 
   Parameters:
       project_client (google.cloud.resourcemanager_v3.ProjectsClient): The Resource Manager Projects client
       project_id (str): The ID of the project to delete
+      dry_run (bool, optional): If True, only simulate the deletion without actually performing it. Default is False.
   """
+  log_message = "%sDeleting project %s." % ("(Simulated) " if dry_run else "",
+                                            project_id)
+  logger.info(log_message)
+
+  estimate.record("ProjectsClient.delete_project")
+  if dry_run:
+    if estimate.active():
+      # A real run only finds liens when the deletion fails, check them now
+      try:
+        with estimate.probe():
+          liens = _list_project_liens(project_id)
+      except Exception as e:
+        logger.warning(f"Failed to list liens of project {project_id}: {e}")
+        liens = []
+      if liens:
+        estimate.record_read("liens.list")
+        estimate.record("liens.delete", len(liens))
+        estimate.record("ProjectsClient.delete_project")
+    return
+
   try:
     project_client.delete_project(name=f"projects/{project_id}")
   except Exception as e:
@@ -94,19 +194,46 @@ def _remove_project_lien(project_id):
       project_id (str): The ID of the project
   """
 
-  # Build the Cloud Resource Manager API client
-  lien_service = build('cloudresourcemanager', 'v3', cache_discovery=False)
-  parent = f"projects/{project_id}"
-  # pylint: disable=no-member
-  request = lien_service.liens().list(parent=parent)
-
-  response = request.execute()
-  liens = response.get("liens", [])
+  lien_service = _lien_service()
+  liens = _list_project_liens(project_id, lien_service)
   if not liens:
     logger.error(
         f"Well that's unexpected! No liens found for project {project_id}")
   else:
     for lien in liens:
       logger.info(f"Deleting lien {lien['name']}")
+      # pylint: disable=no-member
       lien_service.liens().delete(name=lien['name']).execute()
   return liens
+
+
+def _list_project_liens(project_id, lien_service=None):
+  """
+  Lists the liens associated with the project
+
+  Parameters:
+      project_id (str): The ID of the project
+      lien_service (optional): A Cloud Resource Manager API client, built if not provided
+
+  Returns:
+      list: The liens, as dictionaries
+  """
+  if lien_service is None:
+    lien_service = _lien_service()
+  parent = f"projects/{project_id}"
+  # pylint: disable=no-member
+  request = lien_service.liens().list(parent=parent)
+
+  response = request.execute()
+  return response.get("liens", [])
+
+
+def _lien_service():
+  """
+  Returns the Cloud Resource Manager API client used to manage liens, built
+  once per thread since it is not thread-safe
+  """
+  if not hasattr(_local, "lien_service"):
+    _local.lien_service = build('cloudresourcemanager', 'v3',
+                                cache_discovery=False)
+  return _local.lien_service
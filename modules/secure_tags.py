@@ -2,8 +2,10 @@
 """
   Deletes all secure tags which exist within an organization.
 """
+import functools
 import logging
 from google.cloud import resourcemanager_v3
+from modules import estimate, inventory, work_queue
 
 logger = logging.getLogger("default")
 
@@ -20,27 +22,53 @@ def delete(cai_client, organization_id, dry_run):
 
   logger.info(f"Starting processing secure tags")
 
-  tag_values = [
-      x.name.replace("//cloudresourcemanager.googleapis.com/", "")
-      for x in _list_securetagvalues(cai_client, organization_id)
-  ]
+  for task in plan(cai_client, organization_id, dry_run):
+    task.run()
+
+  logger.info(f"Done processing secure tags")
+
+
+def plan(cai_client, organization_id, dry_run):
+  """
+    List the deletion tasks for secure tag values and keys. Each tag key task
+    waits for the tasks of its values, and the task of a project waits for
+    the tasks of its tag keys.
+
+    :param cai_client: The Google Cloud Asset Inventory (CAI) client.
+    :param organization_id: The ID of the organization.
+    :param dry_run: If True, tasks perform a dry run without actually deleting anything.
+    :return: A list of work_queue.DeletionTask objects.
+    """
+
+  tasks = []
+
+  tag_values = _list_securetagvalues(cai_client, organization_id)
 
   logger.info("Retrieved %s secure tag values.", len(tag_values))
 
   for tag_value in tag_values:
-    _delete_tag_value(cai_client, organization_id, tag_value, dry_run)
+    name = tag_value.name.replace("//cloudresourcemanager.googleapis.com/", "")
+    tasks.append(
+        work_queue.DeletionTask(
+            name, "tagvalue",
+            functools.partial(_delete_tag_value, cai_client, organization_id,
+                              name, dry_run),
+            parent=tag_value.parent.replace(
+                "//cloudresourcemanager.googleapis.com/", "")))
 
-  tag_keys = [
-      x.name.replace("//cloudresourcemanager.googleapis.com/", "")
-      for x in _list_securetagkeys(cai_client, organization_id)
-  ]
+  tag_keys = _list_securetagkeys(cai_client, organization_id)
 
   logger.info("Retrieved %s secure tag keys.", len(tag_keys))
 
   for tag_key in tag_keys:
-    _delete_tag_key(tag_key, dry_run)
+    name = tag_key.name.replace("//cloudresourcemanager.googleapis.com/", "")
+    tasks.append(
+        work_queue.DeletionTask(
+            name, "tagkey", functools.partial(_delete_tag_key, name, dry_run),
+            parent=tag_key.parent.replace(
+                "//cloudresourcemanager.googleapis.com/", "")))
 
-  logger.info(f"Done processing secure tags")
+  return tasks
 
 
 def _list_securetagkeys(cai_client, organization_id):
@@ -49,19 +77,19 @@ def _list_securetagkeys(cai_client, organization_id):
 
     :param cai_client: The Google Cloud Asset Inventory (CAI) client.
     :param organization_id: The ID of the organization.
-    :return: A generator that provides the secure tag keys.
+    :return: An inventory.Inventory of secure tag key names and parents.
     """
 
   results_iterator = cai_client.search_all_resources(
       request={
           "scope": f"organizations/{organization_id}",
           "asset_types": ["cloudresourcemanager.googleapis.com/TagKey"],
-          "read_mask": "name",
+          "read_mask": "name,parentFullResourceName",
           "page_size": 500
       })
 
-  list(results_iterator)
-  return results_iterator
+  return inventory.from_search_results(results_iterator,
+                                       fields=("name", "parent"))
 
 
 def _list_securetagvalues(cai_client, organization_id):
@@ -70,19 +98,19 @@ def _list_securetagvalues(cai_client, organization_id):
 
     :param cai_client: The Google Cloud Asset Inventory (CAI) client.
     :param organization_id: The ID of the organization.
-    :return: A generator that provides the secure tag values.
+    :return: An inventory.Inventory of secure tag value names and parent keys.
     """
 
   results_iterator = cai_client.search_all_resources(
       request={
           "scope": f"organizations/{organization_id}",
           "asset_types": ["cloudresourcemanager.googleapis.com/TagValue"],
-          "read_mask": "name",
+          "read_mask": "name,parentFullResourceName",
           "page_size": 500
       })
 
-  list(results_iterator)
-  return results_iterator
+  return inventory.from_search_results(results_iterator,
+                                       fields=("name", "parent"))
 
 
 def _delete_tag_value(cai_client, organization_id, tag_value, dry_run):
@@ -119,7 +147,6 @@ def _delete_tag_value(cai_client, organization_id, tag_value, dry_run):
   }
 
   cai_bindings_response = cai_client.search_all_resources(request=request)
-  list(cai_bindings_response)
 
   for binding in cai_bindings_response:
     _delete_bindings_for_value(binding.name, dry_run)
@@ -127,6 +154,7 @@ def _delete_tag_value(cai_client, organization_id, tag_value, dry_run):
   log_message = "%sDeleting secure tag value %s." % ("(Simulated) " if dry_run
                                                      else "", tag_value)
   logger.info(log_message)
+  estimate.record("TagValuesClient.delete_tag_value")
   if not dry_run:
     try:
       tagvalue_client.delete_tag_value(name=tag_value)
@@ -146,6 +174,7 @@ def _delete_tag_key(tag_key, dry_run):
                                             tag_key)
   logger.info(log_message)
   tagkey_client = resourcemanager_v3.TagKeysClient()
+  estimate.record("TagKeysClient.delete_tag_key")
   if not dry_run:
     tagkey_client.delete_tag_key(name=tag_key)
 
@@ -164,11 +193,11 @@ def _delete_bindings_for_value(resource_name, dry_run):
   logger.info("Fetching bindings for %s.", resource_name)
 
   bindings_response = tagbinding_client.list_tag_bindings(parent=resource_name)
-  list(bindings_response)
 
   for binding in bindings_response:
     log_message = "%sDeleting binding %s." % ("(Simulated) " if dry_run else "",
                                               binding.name)
     logger.info(log_message)
+    estimate.record("TagBindingsClient.delete_tag_binding")
     if not dry_run:
       tagbinding_client.delete_tag_binding(name=binding.name)
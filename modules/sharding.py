@@ -0,0 +1,349 @@
+# pylint: disable=logging-fstring-interpolation,f-string-without-interpolation,consider-using-f-string
+"""
+  Splits organization-wide Cloud Asset Inventory searches into concurrent
+  shards scoped to folder subtrees.
+"""
+import json
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from google.cloud import resourcemanager_v3
+
+logger = logging.getLogger("default")
+
+_CRM = "//cloudresourcemanager.googleapis.com/"
+_DONE = object()
+
+# Shards per concurrent worker. Folders and projects beyond that are grouped
+# into shared shards, so the number of searches does not grow with the number
+# of projects directly under the organization.
+SHARDS_PER_WORKER = 4
+
+# Most folders and projects grouped into a single shard's query
+MAX_SCOPES_PER_SHARD = 50
+
+# Asset types whose parent is outside the folder hierarchy, so no folder or
+# project scope covers those attached to the organization. They get a shard
+# of their own, keyed by the asset type of their parent.
+DETACHED_ASSET_TYPES = {
+    "cloudresourcemanager.googleapis.com/TagValue":
+        "cloudresourcemanager.googleapis.com/TagKey",
+}
+
+
+class ShardedAssetServiceClient:
+  """
+    Drop-in replacement for AssetServiceClient.search_all_resources over an
+    organization scope.
+
+    The organization is partitioned into shards covering its direct children,
+    each top-level folder subtree and each project directly under it. Folders
+    which were larger than their fair share in a previous run are split further
+    along the folder hierarchy. Subtrees are then packed into at most
+    SHARDS_PER_WORKER shards per worker. Shards are searched concurrently,
+    largest first, and their results are merged and de-duplicated by name.
+    Assets attached outside the folder hierarchy, see DETACHED_ASSET_TYPES, are
+    searched in an extra organization-wide shard.
+
+    Searches over any other scope, and targeted searches carrying a query, are
+    passed through unchanged.
+  """
+
+  def __init__(self, cai_client, organization_id, shards, state_file=None,
+               check=False):
+    """
+      Parameters:
+          cai_client (google.cloud.asset_v1.AssetServiceClient): The Cloud Asset Inventory client.
+          organization_id (str): The ID of the organization.
+          shards (int): Number of shards searched concurrently.
+          state_file (str, optional): JSON file used to remember shard sizes across runs.
+          check (bool, optional): If True, also run every sharded search
+                                  unsharded and report results the shards missed.
+    """
+    self._client = cai_client
+    self._organization = f"organizations/{organization_id}"
+    self._workers = shards
+    self._state_file = state_file
+    self._check = check
+    self._state = _load_state(state_file, self._organization)
+    self._shards = None
+    self._shard_scopes = {}
+    self._run_sizes = {}
+    self._lock = threading.Lock()
+
+  def search_all_resources(self, request, **kwargs):
+    """
+      Searches resources, sharding organization-wide listings.
+
+      Parameters:
+          request (dict): The search request, as accepted by AssetServiceClient.
+
+      Returns:
+          An iterator over google.cloud.asset_v1.ResourceSearchResult.
+    """
+    if (not isinstance(request, dict) or
+        request.get("scope") != self._organization or request.get("query")):
+      return self._client.search_all_resources(request=request, **kwargs)
+
+    with self._lock:
+      if self._shards is None:
+        self._shards = self._plan()
+
+    return self._search(request, kwargs)
+
+  def __getattr__(self, name):
+    return getattr(self._client, name)
+
+  def _search(self, request, kwargs):
+    """
+      Runs a request over every shard concurrently, yielding unique results as
+      they arrive.
+    """
+    results = queue.Queue()
+    counts = {}
+
+    def search_shard(shard):
+      scope, query, key = shard
+      shard_request = dict(request, scope=scope)
+      if query:
+        shard_request["query"] = query
+      count = 0
+      try:
+        for resource in self._client.search_all_resources(
+            request=shard_request, **kwargs):
+          results.put(resource)
+          count += 1
+      except Exception as e:  # pylint: disable=broad-except
+        results.put(e)
+      finally:
+        counts[key] = count
+        results.put(_DONE)
+
+    shards = self._shards + _detached_shards(self._organization, request)
+
+    executor = ThreadPoolExecutor(max_workers=self._workers)
+    for shard in shards:
+      executor.submit(search_shard, shard)
+
+    seen = set()
+    pending = len(shards)
+    try:
+      while pending:
+        item = results.get()
+        if item is _DONE:
+          pending -= 1
+        elif isinstance(item, Exception):
+          raise item
+        elif item.name not in seen:
+          seen.add(item.name)
+          yield item
+    finally:
+      executor.shutdown(wait=False, cancel_futures=True)
+
+    self._record(counts)
+
+    if self._check:
+      yield from self._compare(request, kwargs, seen)
+
+  def _compare(self, request, kwargs, seen):
+    """
+      Runs a request unsharded, logging and yielding the results which no
+      shard returned.
+    """
+    missed = [
+        resource
+        for resource in self._client.search_all_resources(request=request,
+                                                          **kwargs)
+        if resource.name not in seen
+    ]
+    searched = request.get("asset_types") or "all assets"
+    if missed:
+      logger.error(f"Sharded search of {searched} missed {len(missed)} "
+                   f"resource(s), e.g. {missed[0].name}")
+    else:
+      logger.info(f"Sharded search of {searched} matches the unsharded search "
+                  f"({len(seen)} resource(s))")
+    yield from missed
+
+  def _plan(self):
+    """
+      Builds the list of shards, largest first.
+
+      Returns:
+          list: Tuples of (scope, query, key).
+    """
+    sizes = self._state["sizes"]
+    children = self._state["children"]
+
+    def size(scope):
+      if scope in children:
+        return sum(size(child) or 0 for child in children[scope])
+      return sizes.get(scope)
+
+    total = size(self._organization)
+    threshold = total / self._workers if total else None
+
+    shards = []
+    subtrees = []
+    estimates = {}
+    new_children = {}
+    to_expand = [self._organization]
+    while to_expand:
+      scope = to_expand.pop()
+      child_scopes = _list_child_scopes(scope)
+      # Shards without a previous size get an even share of their parent's
+      share = size(scope) / (len(child_scopes) + 1) if size(scope) else 0
+
+      direct_key = f"{scope}#direct"
+      shards.append(
+          (scope, f'parentFullResourceName:"{_CRM}{scope}"', direct_key))
+      estimates[direct_key] = size(direct_key) or share
+
+      for child in child_scopes:
+        child_size = size(child)
+        if (child.startswith("folders/") and threshold is not None and
+            child_size is not None and child_size > threshold):
+          to_expand.append(child)
+        else:
+          subtrees.append(child)
+          estimates[child] = child_size or share
+      new_children[scope] = [direct_key] + child_scopes
+
+    self._state["children"] = new_children
+
+    limit = max(1, self._workers * SHARDS_PER_WORKER - len(shards))
+    for group in _pack(subtrees, estimates, limit):
+      if len(group) == 1:
+        shards.append((group[0], None, group[0]))
+        continue
+      key = f"{self._organization}#" + ",".join(group)
+      self._shard_scopes[key] = group
+      estimates[key] = sum(estimates[scope] for scope in group)
+      shards.append((self._organization, _scopes_query(group), key))
+
+    shards.sort(key=lambda shard: -estimates[shard[2]])
+
+    logger.info(f"Searching CAI in {len(shards)} shard(s) with "
+                f"{self._workers} worker(s)")
+    return shards
+
+  def _record(self, counts):
+    """
+      Saves the size of each shard for the next run. Sizes add up across the
+      searches of the current run and replace those of previous runs.
+    """
+    if not self._state_file:
+      return
+    with self._lock:
+      for key, count in counts.items():
+        # Shared shards cannot tell their scopes apart, split evenly
+        scopes = self._shard_scopes.get(key, [key])
+        for scope in scopes:
+          self._run_sizes[scope] = (self._run_sizes.get(scope, 0) +
+                                    count / len(scopes))
+      self._state["sizes"].update(self._run_sizes)
+      _save_state(self._state_file, self._organization, self._state)
+
+
+def _pack(scopes, estimates, limit):
+  """
+    Groups scopes into at most limit groups of similar estimated size, or more
+    if needed to keep groups under MAX_SCOPES_PER_SHARD scopes.
+
+    Parameters:
+        scopes (list): Folder and project scopes.
+        estimates (dict): Estimated size of each scope.
+        limit (int): Preferred maximum number of groups.
+
+    Returns:
+        list: Lists of scopes.
+  """
+  count = min(len(scopes), max(limit, -(-len(scopes) // MAX_SCOPES_PER_SHARD)))
+  groups = [(0, i, []) for i in range(count)]
+  for scope in sorted(scopes, key=lambda scope: -estimates[scope]):
+    # Largest first into the smallest group with room left
+    load, i, group = min(
+        (g for g in groups if len(g[2]) < MAX_SCOPES_PER_SHARD),
+        key=lambda g: (g[0], len(g[2])))
+    group.append(scope)
+    groups[i] = (load + estimates[scope], i, group)
+  return [group for _, _, group in groups if group]
+
+
+def _scopes_query(scopes):
+  """
+    Builds a CAI query matching the resources within any of the scopes.
+  """
+  terms = [
+      f"folders:{scope.split('/')[1]}" if scope.startswith("folders/") else
+      f"project:{scope.split('/')[1]}" for scope in scopes
+  ]
+  return f"({' OR '.join(terms)})"
+
+
+def _detached_shards(organization, request):
+  """
+    Builds the shards covering the requested assets attached outside the
+    folder hierarchy.
+
+    Returns:
+        list: Tuples of (scope, query, key).
+  """
+  asset_types = request.get("asset_types") or list(DETACHED_ASSET_TYPES)
+  return [(organization, f'parentAssetType:"{parent_type}"',
+           f"{organization}#{parent_type}")
+          for asset_type, parent_type in DETACHED_ASSET_TYPES.items()
+          if asset_type in asset_types]
+
+
+def _list_child_scopes(scope):
+  """
+    Lists the folders and projects directly under a scope.
+
+    Parameters:
+        scope (str): An 'organizations/{id}' or 'folders/{id}' name.
+
+    Returns:
+        list: Child scopes, in 'folders/{id}' or 'projects/{id}' format.
+  """
+  folders_client = resourcemanager_v3.FoldersClient()
+  projects_client = resourcemanager_v3.ProjectsClient()
+  children = [
+      folder.name for folder in folders_client.list_folders(parent=scope)
+  ]
+  children += [
+      project.name for project in projects_client.list_projects(parent=scope)
+  ]
+  return children
+
+
+def _load_state(state_file, organization):
+  """
+    Loads the shard sizes recorded for an organization by a previous run.
+  """
+  state = {"sizes": {}, "children": {}}
+  if state_file and os.path.exists(state_file):
+    try:
+      with open(state_file, encoding="utf-8") as f:
+        state.update(json.load(f).get(organization, {}))
+    except (OSError, ValueError) as e:
+      logger.warning(f"Ignoring unreadable shard state {state_file}: {e}")
+  return state
+
+
+def _save_state(state_file, organization, state):
+  """
+    Saves the shard sizes of an organization, keeping other organizations.
+  """
+  data = {}
+  if os.path.exists(state_file):
+    try:
+      with open(state_file, encoding="utf-8") as f:
+        data = json.load(f)
+    except (OSError, ValueError):
+      data = {}
+  data[organization] = state
+  with open(state_file, "w", encoding="utf-8") as f:
+    json.dump(data, f, indent=2)
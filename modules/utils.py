@@ -2,36 +2,73 @@
 import logging
 from collections import deque
 from google.cloud import resourcemanager_v3
+from modules import inventory
 
 logger = logging.getLogger("default")
 
 
-def list_all_folders(organization_id: str, exclude_folders_list: list = []):
+def list_all_folders(organization_id: str, exclude_folders=None):
   """
     Lists all folders under the specified organization, including nested folders.
+    Excluded folders are skipped along with their subtree.
 
     Args:
         organization_id: GCP organization ID
+        exclude_folders: An exclusions.ExclusionSet of folders to skip
 
-    Returns: A list of folder objects in deletion order (leaves first).
+    Returns: An inventory.Inventory of folder names and parents, parents first.
   """
-  folders = []
+  folders = inventory.Inventory(fields=("name", "parent"))
   # Add organization as the first node
-  folders.append(
-      resourcemanager_v3.Folder(name=f"organizations/{organization_id}"))
+  folders.append(name=f"organizations/{organization_id}")
   queue = deque([f"organizations/{organization_id}"])
 
   while queue:
     parent = queue.popleft()
-    if parent in exclude_folders_list:
-      logger.info(f"Excluding folder '{parent}'")
-      continue
-
     client = resourcemanager_v3.FoldersClient()
     request = resourcemanager_v3.ListFoldersRequest(parent=parent)
     logger.info(f"Retrieving folders under {parent}")
     for folder in client.list_folders(request=request):
+      if exclude_folders and exclude_folders.matches(folder.name):
+        logger.info(f"Excluding folder '{folder.name}'")
+        continue
       logger.info(f"Found folder parent={parent} folder={folder.name}")
-      folders.append(folder)
+      folders.append(name=folder.name, parent=folder.parent)
       queue.append(folder.name)
   return folders
+
+
+def search_inventory(cai_client, organization_id: str, asset_types: list,
+                     fields: tuple = ("name",), read_mask: str = "*"):
+  """
+    Retrieves every resource of the given asset types in a single Cloud Asset
+    Inventory search, instead of issuing one search per asset type.
+
+    Args:
+        cai_client: The Cloud Asset Inventory client.
+        organization_id: GCP organization ID
+        asset_types: List of CAI asset types to retrieve.
+        fields: Fields to keep for each resource, see inventory.FIELDS.
+        read_mask: Fields to populate on each result.
+
+    Returns: A dictionary mapping each asset type to an inventory.Inventory.
+  """
+  inventories = {
+      asset_type: inventory.Inventory(fields) for asset_type in asset_types
+  }
+
+  results_iterator = cai_client.search_all_resources(
+      request={
+          "scope": f"organizations/{organization_id}",
+          "asset_types": asset_types,
+          "read_mask": read_mask,
+          "page_size": 500
+      })
+
+  for resource in results_iterator:
+    if resource.asset_type not in inventories:
+      inventories[resource.asset_type] = inventory.Inventory(fields)
+    target = inventories[resource.asset_type]
+    target.append(**inventory.search_result_values(resource, target.fields))
+
+  return inventories
@@ -0,0 +1,242 @@
+# pylint: disable=logging-fstring-interpolation,f-string-without-interpolation,consider-using-f-string
+"""
+  Verifies that an organization has been cleaned up, reporting any residue.
+"""
+import functools
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from google.api_core.exceptions import NotFound
+from google.cloud import compute_v1, logging_v2, orgpolicy_v2, resourcemanager_v3
+from google.cloud.iam_admin_v1 import IAMClient, GetRoleRequest
+from modules import utils
+
+logger = logging.getLogger("default")
+
+FOLDER = "cloudresourcemanager.googleapis.com/Folder"
+PROJECT = "cloudresourcemanager.googleapis.com/Project"
+ORGANIZATION = "cloudresourcemanager.googleapis.com/Organization"
+TAG_KEY = "cloudresourcemanager.googleapis.com/TagKey"
+TAG_VALUE = "cloudresourcemanager.googleapis.com/TagValue"
+CUSTOM_ROLE = "iam.googleapis.com/Role"
+ORG_POLICY = "orgpolicy.googleapis.com/Policy"
+LOG_SINK = "logging.googleapis.com/LogSink"
+FIREWALL_POLICY = "compute.googleapis.com/FirewallPolicy"
+
+# Asset types covered by each deletion stage
+STAGE_ASSET_TYPES = {
+    "customroles": [CUSTOM_ROLE],
+    "orgpolicies": [ORG_POLICY],
+    "fwpolicies": [FIREWALL_POLICY],
+    "logsinks": [LOG_SINK],
+    "securetags": [TAG_VALUE, TAG_KEY],
+    "projects": [PROJECT],
+    "folders": [FOLDER],
+}
+
+
+def verify(cai_client, organization_id, stages, excluded, max_workers=16,
+           report_file=None):
+  """
+    Re-scans the organization and reports resources which survived the cleanup.
+
+    Candidates are discovered with a single Cloud Asset Inventory search, then
+    confirmed concurrently against the owning API, since CAI can lag behind
+    recent deletions.
+
+    Parameters:
+        cai_client (google.cloud.asset_v1.AssetServiceClient): The Cloud Asset Inventory client.
+        organization_id (str): The ID of the organization.
+        stages (list): Names of the deletion stages to verify, as in STAGE_ASSET_TYPES.
+        excluded (exclusions.Exclusions): Resources excluded from deletion.
+        max_workers (int): Number of concurrent existence checks.
+        report_file (str, optional): Path of a JSON file to write the residue report to.
+
+    Returns:
+        list: A list of dictionaries describing the residual resources.
+  """
+  logger.info("Starting verification")
+
+  asset_types = [
+      asset_type for stage in stages for asset_type in STAGE_ASSET_TYPES[stage]
+  ]
+  inventory = utils.search_inventory(
+      cai_client, organization_id, asset_types,
+      fields=("name", "asset_type", "parent_asset_type", "state", "folders",
+              "project_id", "labels"),
+      read_mask=
+      "name,assetType,state,folders,parentAssetType,additionalAttributes,labels"
+  )
+
+  candidates = []
+  for asset_type in asset_types:
+    for resource in inventory.get(asset_type, []):
+      if _is_expected(resource, excluded):
+        continue
+      candidates.append({
+          "asset_type": asset_type,
+          "name": _resource_name(resource),
+      })
+
+  logger.info(f"Checking existence of {len(candidates)} candidate resource(s)")
+
+  checkers = existence_checkers(
+      [candidate["asset_type"] for candidate in candidates])
+  with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    statuses = list(
+        executor.map(lambda c: check(checkers, c["asset_type"], c["name"]),
+                     candidates))
+
+  residue = []
+  for candidate, status in zip(candidates, statuses):
+    if status == "absent":
+      continue
+    candidate["status"] = status
+    residue.append(candidate)
+
+  for asset_type in asset_types:
+    count = sum(1 for r in residue if r["asset_type"] == asset_type)
+    logger.info(f"{asset_type}: {count} residual resource(s)")
+
+  for resource in residue:
+    logger.warning(
+        f"Residual {resource['asset_type']} {resource['name']} ({resource['status']})"
+    )
+
+  if report_file:
+    with open(report_file, "w", encoding="utf-8") as f:
+      json.dump(
+          {
+              "organization": organization_id,
+              "checked": len(candidates),
+              "residue": residue
+          }, f, indent=2)
+    logger.info(f"Residue report written to {report_file}")
+
+  if residue:
+    logger.error(f"Verification found {len(residue)} residual resource(s)")
+  else:
+    logger.info("Verification found no residual resources")
+
+  logger.info("Done verification")
+  return residue
+
+
+def _resource_name(resource):
+  """
+    Converts a CAI full resource name into the name expected by the owning API.
+
+    Parameters:
+        resource (inventory.Record): The resource found by CAI.
+
+    Returns:
+        str: The relative resource name, or the policy ID for firewall policies.
+  """
+  name = resource.name.split("googleapis.com/", 1)[-1]
+  if resource.asset_type == FIREWALL_POLICY:
+    return name.split("/")[-1]
+  return name
+
+
+def _is_expected(resource, excluded):
+  """
+    Tells whether a resource is expected to survive the cleanup.
+
+    Mirrors the filters applied by the deletion stages: exclusions, built-in
+    log sinks, resources already pending deletion and resources the stages do
+    not target.
+
+    Parameters:
+        resource (inventory.Record): The resource found by CAI.
+        excluded (exclusions.Exclusions): Resources excluded from deletion.
+
+    Returns:
+        bool: True if the resource should not be reported as residue.
+  """
+  asset_type = resource.asset_type
+  name = _resource_name(resource)
+
+  if asset_type in (FOLDER, PROJECT):
+    if resource.state and resource.state != "ACTIVE":
+      return True
+    if any(excluded["folder"].matches(folder)
+           for folder in resource.folders + (name,)):
+      return True
+    if asset_type == PROJECT:
+      return excluded["project"].matches(resource.project_id,
+                                         dict(resource.labels))
+    return False
+
+  if asset_type == CUSTOM_ROLE:
+    return (resource.parent_asset_type != ORGANIZATION or
+            excluded["customrole"].matches(name))
+
+  if asset_type == LOG_SINK:
+    return (resource.parent_asset_type not in (FOLDER, ORGANIZATION) or
+            name.endswith("_Default") or name.endswith("_Required") or
+            excluded["logsink"].matches(name))
+
+  return False
+
+
+def existence_checkers(asset_types=None):
+  """
+    Builds the functions used to confirm a resource still exists. Only the
+    clients of the requested asset types are created.
+
+    Parameters:
+        asset_types (list, optional): Asset types to build checks for, all if not provided.
+
+    Returns:
+        dict: Functions keyed by asset type, each taking a resource name and
+              returning True if the resource is still live.
+  """
+  builders = {
+      FOLDER: (resourcemanager_v3.FoldersClient,
+               lambda client, name: client.get_folder(name=name).state ==
+               resourcemanager_v3.Folder.State.ACTIVE),
+      PROJECT: (resourcemanager_v3.ProjectsClient,
+                lambda client, name: client.get_project(name=name).state ==
+                resourcemanager_v3.Project.State.ACTIVE),
+      TAG_KEY: (resourcemanager_v3.TagKeysClient,
+                lambda client, name: bool(client.get_tag_key(name=name))),
+      TAG_VALUE: (resourcemanager_v3.TagValuesClient,
+                  lambda client, name: bool(client.get_tag_value(name=name))),
+      CUSTOM_ROLE: (IAMClient, lambda client, name: not client.get_role(
+          GetRoleRequest(name=name)).deleted),
+      ORG_POLICY: (orgpolicy_v2.OrgPolicyClient,
+                   lambda client, name: bool(client.get_policy(name=name))),
+      FIREWALL_POLICY: (compute_v1.FirewallPoliciesClient,
+                        lambda client, name: bool(
+                            client.get(firewall_policy=name))),
+      LOG_SINK: (logging_v2.Client, lambda client, name: bool(
+          client.sinks_api.sink_get(name))),
+  }
+
+  checkers = {}
+  for asset_type in set(builders if asset_types is None else asset_types):
+    if asset_type in builders:
+      client_class, exists = builders[asset_type]
+      checkers[asset_type] = functools.partial(exists, client_class())
+  return checkers
+
+
+def check(checkers, asset_type, name):
+  """
+    Checks whether a single resource still exists.
+
+    Parameters:
+        checkers (dict): Existence check functions keyed by asset type.
+        asset_type (str): The CAI asset type of the resource.
+        name (str): The resource name expected by the owning API.
+
+    Returns:
+        str: 'present', 'absent' or 'unknown' if the check itself failed.
+  """
+  try:
+    return "present" if checkers[asset_type](name) else "absent"
+  except NotFound:
+    return "absent"
+  except Exception as e:
+    logger.warning(f"Failed to check {asset_type} {name}: {e}")
+    return "unknown"
@@ -0,0 +1,261 @@
+# pylint: disable=logging-fstring-interpolation,f-string-without-interpolation,consider-using-f-string
+"""
+  Runs deletion tasks from every module on a shared, prioritized worker pool.
+"""
+import heapq
+import logging
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger("default")
+
+# Relative cost estimates per task kind, roughly proportional to observed
+# wall time. Projects are the long pole, especially when liens are involved.
+KIND_COSTS = {
+    "customrole": 1.0,
+    "orgpolicy": 1.0,
+    "logsink": 1.0,
+    "fwpolicy": 2.0,
+    "fwassociation": 4.0,
+    "tagvalue": 3.0,
+    "tagkey": 1.0,
+    "project": 10.0,
+    "folder": 2.0,
+}
+
+# Kinds of tasks which only start once every task of the listed kinds has
+# completed. Tag values remove the tag bindings of the projects and folders
+# they are attached to, which are only looked up when the value is deleted.
+KIND_BARRIERS = {
+    "project": ("tagvalue",),
+    "folder": ("tagvalue",),
+}
+
+_local = threading.local()
+
+
+class DeletionTask:
+  """
+    A single resource deletion.
+
+    A task becomes ready once every task listing this task's key among its
+    parents has completed, e.g. a folder waits for its projects and child
+    folders, a tag key waits for its values, and a folder waits for the
+    firewall policy associations attached to it. Tasks also wait for the kinds
+    of tasks listed in KIND_BARRIERS.
+
+    Attributes:
+        key (str): Unique resource name of the task.
+        kind (str): Kind of resource, as in KIND_COSTS.
+        action (callable): Performs (or simulates) the deletion.
+        parents (list): Keys of the tasks which must wait for this one.
+        cost (float): Estimated cost of the deletion.
+  """
+
+  def __init__(self, key, kind, action, parent=None, cost=None):
+    """
+      Parameters:
+          parent (str or list, optional): Key, or keys, of the tasks which must
+                                          wait for this one.
+    """
+    self.key = key
+    self.kind = kind
+    self.action = action
+    if parent is None:
+      self.parents = []
+    elif isinstance(parent, str):
+      self.parents = [parent]
+    else:
+      self.parents = list(parent)
+    self.cost = KIND_COSTS.get(kind, 1.0) if cost is None else cost
+
+  def run(self):
+    """
+      Runs the deletion, making the task available through current_task().
+    """
+    previous = getattr(_local, "task", None)
+    _local.task = self
+    try:
+      return self.action()
+    finally:
+      _local.task = previous
+
+  def __repr__(self):
+    return f"DeletionTask({self.kind} {self.key})"
+
+
+def run(tasks, workers):
+  """
+    Runs tasks concurrently, most expensive critical path first.
+
+    A task's priority is its own cost plus the cost of the most expensive
+    chain of tasks it blocks, so projects in deeply nested folders start early
+    and the slowest chains do not serialize at the end of the run.
+
+    Parameters:
+        tasks (list): List of DeletionTask objects.
+        workers (int): Number of concurrent workers.
+  """
+  logger.info(f"Running {len(tasks)} task(s) with {workers} worker(s)")
+
+  schedule = _Schedule(tasks)
+
+  failed = 0
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    running = {}
+    while schedule.ready or running:
+      while schedule.ready and len(running) < workers:
+        task = schedule.pop()
+        running[executor.submit(task.run)] = task
+
+      done, _ = wait(running, return_when=FIRST_COMPLETED)
+      for future in done:
+        task = running.pop(future)
+        if future.exception() is not None:
+          failed += 1
+          logger.error(f"Failed to delete {task.kind} {task.key}: "
+                       f"{future.exception()}")
+        schedule.finish(task)
+
+  logger.info(f"Done running tasks, {failed} failure(s)")
+
+
+def current_task():
+  """
+    Returns the DeletionTask running in the current thread, if any.
+  """
+  return getattr(_local, "task", None)
+
+
+def simulate(tasks, workers, durations):
+  """
+    Predicts how long run() would take, scheduling tasks the same way.
+
+    Parameters:
+        tasks (list): List of DeletionTask objects.
+        workers (int): Number of concurrent workers.
+        durations (dict): Predicted duration of each task in seconds, keyed by task key.
+
+    Returns:
+        float: The predicted makespan in seconds.
+  """
+  schedule = _Schedule(tasks)
+
+  now = 0.0
+  running = []
+  while schedule.ready or running:
+    while schedule.ready and len(running) < workers:
+      task = schedule.pop()
+      heapq.heappush(running, (now + durations.get(task.key, 0.0),
+                               schedule.positions[id(task)], task))
+
+    now, _, task = heapq.heappop(running)
+    schedule.finish(task)
+
+  return now
+
+
+class _Schedule:
+  """
+    Tracks the tasks which are ready to run, highest priority first.
+
+    Attributes:
+        ready (list): Heap of (-rank, position, task) tuples.
+        positions (dict): Position of each task in the task list, keyed by
+                          id() so that tasks sharing a key never tie.
+  """
+
+  def __init__(self, tasks):
+    # Tasks sharing a key all wait for, and are released by, the same tasks
+    self._by_key = defaultdict(list)
+    for task in tasks:
+      self._by_key[task.key].append(task)
+    self.positions = {id(task): seq for seq, task in enumerate(tasks)}
+    self._pending = {task.key: 0 for task in tasks}
+    for task in tasks:
+      for parent in task.parents:
+        if parent in self._by_key:
+          self._pending[parent] += 1
+    self._remaining = Counter(task.kind for task in tasks)
+    self._held = defaultdict(list)
+    self._ranks = _ranks(tasks, {task.key: task for task in tasks})
+
+    self.ready = []
+    for task in tasks:
+      if self._pending[task.key] == 0:
+        self._release(task)
+
+  def pop(self):
+    """
+      Removes and returns the ready task with the highest priority.
+    """
+    return heapq.heappop(self.ready)[2]
+
+  def finish(self, task):
+    """
+      Marks a task completed, releasing the tasks waiting for it.
+    """
+    for key in task.parents:
+      if key in self._by_key:
+        self._pending[key] -= 1
+        if self._pending[key] == 0:
+          for parent in self._by_key[key]:
+            self._release(parent)
+
+    self._remaining[task.kind] -= 1
+    if self._remaining[task.kind] == 0:
+      for held in self._held.pop(task.kind, []):
+        self._release(held)
+
+  def _release(self, task):
+    """
+      Makes a task without pending children ready, unless a barrier holds it.
+    """
+    for kind in KIND_BARRIERS.get(task.kind, ()):
+      if self._remaining[kind]:
+        self._held[kind].append(task)
+        return
+    heapq.heappush(self.ready,
+                   (-self._ranks[task.key], self.positions[id(task)], task))
+
+
+def _ranks(tasks, by_key):
+  """
+    Computes the critical path cost of every task: its own cost plus the
+    highest cost among the tasks waiting for it, transitively.
+
+    Parameters:
+        tasks (list): List of DeletionTask objects.
+        by_key (dict): Tasks keyed by key.
+
+    Returns:
+        dict: Critical path cost per key.
+  """
+  ranks = {}
+  for task in tasks:
+    stack = [task]
+    while stack:
+      current = stack[-1]
+      unranked = [
+          by_key[key]
+          for key in current.parents
+          if key in by_key and key not in ranks
+      ]
+      if unranked:
+        stack.extend(unranked)
+        continue
+      stack.pop()
+      ranks[current.key] = current.cost + max(
+          (ranks[key] for key in current.parents if key in by_key),
+          default=0.0)
+
+  # Tasks holding a barrier also block every task held by it
+  for kind, barriers in KIND_BARRIERS.items():
+    held = max((ranks[task.key] for task in tasks if task.kind == kind),
+               default=0.0)
+    for task in tasks:
+      if task.kind in barriers:
+        ranks[task.key] = max(ranks[task.key], task.cost + held)
+
+  return ranks
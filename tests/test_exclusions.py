@@ -0,0 +1,96 @@
+"""
+  Tests for the exclusion rules.
+"""
+import re
+
+import pytest
+
+from modules import exclusions
+
+
+def test_exact_names():
+  excluded = exclusions.from_options(projects="keep-me,also-me")
+  assert excluded["project"].matches("keep-me")
+  assert excluded["project"].matches("also-me")
+  assert not excluded["project"].matches("keep-me-not")
+
+
+def test_prefixes_match_whole_segments():
+  excluded = exclusions.from_options(logsinks="folders/123/")
+  sinks = excluded["logsink"]
+  assert sinks.matches("folders/123/sinks/audit")
+  assert sinks.matches("folders/123")
+  assert not sinks.matches("folders/1234/sinks/audit")
+  assert not sinks.matches("organizations/1/sinks/audit")
+
+
+def test_globs():
+  excluded = exclusions.from_options(
+      customroles="organizations/1/roles/keep*,organizations/1/roles/r?")
+  roles = excluded["customrole"]
+  assert roles.matches("organizations/1/roles/keepAlpha")
+  assert roles.matches("organizations/1/roles/r1")
+  assert not roles.matches("organizations/1/roles/r12")
+  assert not roles.matches("organizations/2/roles/keepAlpha")
+
+
+def test_label_selectors_match_values_exactly():
+  excluded = exclusions.from_options(
+      projects="labels.env=prod,labels.protected")
+  projects = excluded["project"]
+  assert projects.matches("p", {"env": "prod"})
+  assert not projects.matches("p", {"env": "prod-old"})
+  assert projects.matches("p", {"protected": "anything"})
+  assert not projects.matches("p", {})
+  assert not projects.matches("p")
+
+
+def test_label_query():
+  excluded = exclusions.from_options(
+      projects="labels.env=prod,labels.protected")
+  assert (excluded["project"].label_query() ==
+          "NOT labels.env=prod AND NOT labels.protected:*")
+  assert exclusions.Exclusions()["project"].label_query() == ""
+
+
+def test_label_selectors_are_only_accepted_for_projects():
+  with pytest.raises(ValueError):
+    exclusions.from_options(logsinks="labels.env=prod")
+  with pytest.raises(ValueError):
+    exclusions.from_options(customroles="labels.env")
+
+
+def test_empty_sets_are_false():
+  excluded = exclusions.from_options(projects="", folders=None)
+  assert not excluded["project"]
+  assert not excluded["folder"]
+  assert exclusions.from_options(folders="folders/1")["folder"]
+
+
+def test_file_rules(tmp_path):
+  path = tmp_path / "exclusions.txt"
+  path.write_text("# comment\n"
+                  "\n"
+                  "project keep-me\n"
+                  "project\tlabels.env=prod\n"
+                  "folder   folders/1\n"
+                  "logsink organizations/1/sinks/*\n")
+  excluded = exclusions.from_options(str(path), projects="cli-project")
+  assert excluded["project"].matches("keep-me")
+  assert excluded["project"].matches("cli-project")
+  assert excluded["project"].matches("other", {"env": "prod"})
+  assert excluded["folder"].matches("folders/1")
+  assert excluded["logsink"].matches("organizations/1/sinks/audit")
+
+
+@pytest.mark.parametrize("line", [
+    "bucket my-bucket",
+    "project",
+    "logsink labels.env=prod",
+    "project labels.",
+])
+def test_invalid_file_rules_report_their_line(tmp_path, line):
+  path = tmp_path / "exclusions.txt"
+  path.write_text(f"project keep-me\n{line}\n")
+  with pytest.raises(ValueError, match=re.escape(f"{path}:2: ")):
+    exclusions.from_options(str(path))
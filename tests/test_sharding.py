@@ -0,0 +1,167 @@
+"""
+  Tests for the sharding of Cloud Asset Inventory searches.
+"""
+import re
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.cloud.resourcemanager_v3")
+
+# pylint: disable=wrong-import-position
+from modules import sharding
+
+CRM = "//cloudresourcemanager.googleapis.com/"
+TAG_VALUE = "cloudresourcemanager.googleapis.com/TagValue"
+LOG_SINK = "logging.googleapis.com/LogSink"
+
+TREE = {
+    "organizations/1": ["folders/10", "folders/20"] +
+                       [f"projects/{n}" for n in range(100, 110)],
+    "folders/10": ["folders/11", "projects/110"],
+    "folders/11": ["projects/111"],
+    "folders/20": [],
+}
+
+
+def _ancestors(scope):
+  for parent, children in TREE.items():
+    if scope in children:
+      return [parent] + _ancestors(parent)
+  return []
+
+
+def _resource(name, asset_type, parent, parent_asset_type=None):
+  chain = [parent] + _ancestors(parent)
+  return SimpleNamespace(
+      name=name, asset_type=asset_type, parent_full_resource_name=CRM + parent,
+      parent_asset_type=parent_asset_type,
+      folders=[s.split("/")[1] for s in chain if s.startswith("folders/")],
+      project=next((s for s in chain if s.startswith("projects/")), None),
+      chain=chain)
+
+
+def _resources():
+  resources = []
+  for parent, children in TREE.items():
+    for child in children:
+      resources.append(_resource(CRM + child, "Container", parent))
+  for parent in ["organizations/1", "folders/10", "folders/11", "projects/111",
+                 "projects/100", "projects/105"]:
+    resources.append(_resource(f"{parent}/sinks/s", LOG_SINK, parent))
+  for value in (1, 2):
+    tag_value = _resource(f"{CRM}tagValues/{value}", TAG_VALUE, "tagKeys/1",
+                          "cloudresourcemanager.googleapis.com/TagKey")
+    tag_value.chain = ["organizations/1"]
+    resources.append(tag_value)
+  return resources
+
+
+def _matches(resource, query):
+  """
+    Evaluates the subset of the CAI query syntax used by the shards.
+  """
+  if not query:
+    return True
+  match = re.fullmatch(r'parentFullResourceName:"(.*)"', query)
+  if match:
+    return resource.parent_full_resource_name == match.group(1)
+  match = re.fullmatch(r'parentAssetType:"(.*)"', query)
+  if match:
+    return resource.parent_asset_type == match.group(1)
+  match = re.fullmatch(r"\((.*)\)", query)
+  if match:
+    for term in match.group(1).split(" OR "):
+      field, value = term.split(":")
+      if field == "project" and resource.project == f"projects/{value}":
+        return True
+      if field == "folders" and value in resource.folders:
+        return True
+    return False
+  if query.startswith("tagValues:"):
+    return False
+  raise AssertionError(f"Unexpected query {query}")
+
+
+class FakeAssetServiceClient:
+  """
+    Serves searches over a fixed set of resources, recording the requests.
+  """
+
+  def __init__(self):
+    self.resources = _resources()
+    self.requests = []
+
+  def search_all_resources(self, request):
+    self.requests.append(request)
+    scope = request["scope"]
+    return [
+        resource for resource in self.resources
+        if (not request.get("asset_types") or
+            resource.asset_type in request["asset_types"]) and
+        (scope == "organizations/1" or
+         (scope in resource.chain and resource.name != CRM + scope)) and
+        _matches(resource, request.get("query"))
+    ]
+
+
+@pytest.fixture(name="client")
+def fixture_client(monkeypatch):
+  monkeypatch.setattr(sharding, "_list_child_scopes",
+                      lambda scope: list(TREE.get(scope, [])))
+  return FakeAssetServiceClient()
+
+
+@pytest.mark.parametrize("asset_types", [[TAG_VALUE], [LOG_SINK], None])
+def test_shards_return_the_same_resources_as_an_unsharded_search(
+    client, asset_types):
+  request = {"scope": "organizations/1"}
+  if asset_types:
+    request["asset_types"] = asset_types
+  sharded = sharding.ShardedAssetServiceClient(client, "1", 2)
+
+  names = [resource.name for resource in sharded.search_all_resources(request)]
+
+  assert len(names) == len(set(names))
+  assert set(names) == {
+      resource.name for resource in client.search_all_resources(request)
+  }
+
+
+def test_searches_with_a_query_are_passed_through(client):
+  sharded = sharding.ShardedAssetServiceClient(client, "1", 2)
+  request = {"scope": "organizations/1", "query": "tagValues:x"}
+  assert not list(sharded.search_all_resources(request))
+  assert client.requests == [request]
+
+
+def test_shard_count_is_capped(client, monkeypatch):
+  monkeypatch.setattr(sharding, "SHARDS_PER_WORKER", 2)
+  sharded = sharding.ShardedAssetServiceClient(client, "1", 2)
+  list(sharded.search_all_resources({"scope": "organizations/1"}))
+  # The organization's direct resources, 3 packed shards and tag values
+  assert len(client.requests) == 5
+
+
+def test_pack_balances_estimates():
+  estimates = {"a": 10, "b": 6, "c": 4, "d": 1, "e": 1}
+  groups = sharding._pack(list(estimates), estimates, 2)  # pylint: disable=protected-access
+  assert len(groups) == 2
+  assert [sum(estimates[scope] for scope in group) for group in groups] == [
+      11, 11
+  ]
+
+
+def test_pack_limits_scopes_per_shard(monkeypatch):
+  monkeypatch.setattr(sharding, "MAX_SCOPES_PER_SHARD", 3)
+  scopes = [f"projects/{n}" for n in range(10)]
+  groups = sharding._pack(scopes, dict.fromkeys(scopes, 0), 2)  # pylint: disable=protected-access
+  assert len(groups) == 4
+  assert all(len(group) <= 3 for group in groups)
+  assert sorted(scope for group in groups for scope in group) == sorted(scopes)
+
+
+def test_scopes_query():
+  # pylint: disable=protected-access
+  assert (sharding._scopes_query(["folders/1", "projects/2"]) ==
+          "(folders:1 OR project:2)")
@@ -0,0 +1,127 @@
+"""
+  Tests for the deletion task scheduler.
+"""
+import threading
+
+from modules import work_queue
+
+
+def _tasks(log, specs):
+  """
+    Builds tasks appending their key to log when run, from (key, kind, parent)
+    tuples.
+  """
+  lock = threading.Lock()
+
+  def action(key):
+
+    def run():
+      with lock:
+        log.append(key)
+
+    return run
+
+  return [
+      work_queue.DeletionTask(key, kind, action(key), parent=parent)
+      for key, kind, parent in specs
+  ]
+
+
+def _positions(log):
+  return {key: index for index, key in enumerate(log)}
+
+
+def test_children_complete_before_parents():
+  log = []
+  tasks = _tasks(log, [
+      ("folders/1", "folder", "organizations/1"),
+      ("folders/2", "folder", "folders/1"),
+      ("projects/1", "project", "folders/2"),
+      ("projects/1/policies/a", "orgpolicy", "projects/1"),
+  ])
+  work_queue.run(tasks, 4)
+  order = _positions(log)
+  assert (order["projects/1/policies/a"] < order["projects/1"] <
+          order["folders/2"] < order["folders/1"])
+
+
+def test_task_with_several_parents_blocks_each():
+  log = []
+  tasks = _tasks(log, [
+      ("firewallPolicies/9", "fwpolicy", "organizations/1"),
+      ("folders/1", "folder", "organizations/1"),
+      ("firewallPolicies/9/associations/a", "fwassociation",
+       ["firewallPolicies/9", "folders/1"]),
+  ])
+  work_queue.run(tasks, 2)
+  order = _positions(log)
+  association = order["firewallPolicies/9/associations/a"]
+  assert association < order["firewallPolicies/9"]
+  assert association < order["folders/1"]
+
+
+def test_barrier_holds_projects_and_folders_until_tag_values_complete():
+  log = []
+  tasks = _tasks(log, [
+      ("projects/1", "project", None),
+      ("folders/1", "folder", None),
+      ("tagValues/1", "tagvalue", "tagKeys/1"),
+      ("tagValues/2", "tagvalue", "tagKeys/1"),
+      ("tagKeys/1", "tagkey", "projects/1"),
+  ])
+  work_queue.run(tasks, 4)
+  order = _positions(log)
+  for key in ("projects/1", "folders/1"):
+    assert order[key] > order["tagValues/1"]
+    assert order[key] > order["tagValues/2"]
+  assert order["tagKeys/1"] < order["projects/1"]
+
+
+def test_highest_critical_path_runs_first():
+  log = []
+  tasks = _tasks(log, [
+      ("organizations/1/sinks/a", "logsink", None),
+      ("projects/1", "project", "folders/1"),
+      ("folders/1", "folder", None),
+  ])
+  work_queue.run(tasks, 1)
+  assert log == ["projects/1", "folders/1", "organizations/1/sinks/a"]
+
+
+def test_tasks_sharing_a_key_are_all_run():
+  log = []
+  tasks = _tasks(log, [
+      ("a", "customrole", None),
+      ("a", "customrole", None),
+      ("b", "customrole", "a"),
+  ])
+  work_queue.run(tasks, 2)
+  assert sorted(log) == ["a", "a", "b"]
+  assert log[0] == "b"
+
+
+def test_failed_task_still_releases_its_parent():
+  log = []
+
+  def fail():
+    raise RuntimeError("boom")
+
+  tasks = [
+      work_queue.DeletionTask("projects/1", "project", fail,
+                              parent="folders/1"),
+      work_queue.DeletionTask("folders/1", "folder",
+                              lambda: log.append("folders/1")),
+  ]
+  work_queue.run(tasks, 2)
+  assert log == ["folders/1"]
+
+
+def test_simulate_follows_dependencies():
+  tasks = _tasks([], [
+      ("projects/1", "project", "folders/1"),
+      ("projects/2", "project", "folders/1"),
+      ("folders/1", "folder", None),
+  ])
+  durations = {"projects/1": 3.0, "projects/2": 2.0, "folders/1": 1.0}
+  assert work_queue.simulate(tasks, 1, durations) == 6.0
+  assert work_queue.simulate(tasks, 2, durations) == 4.0